@@ -0,0 +1,79 @@
+'''
+Benchmark of the DataVRP cost matrix: the former dict built by a double
+Python loop against the dense NumPy matrix.
+
+Usage:
+    python bench_cost_matrix.py [--synthetic 5000] [--legacy-large]
+
+The dict needs several GB above a few thousand nodes, so by default it is
+only timed up to LEGACY_MAX_NODES nodes.
+'''
+
+import argparse
+import glob
+import time
+
+import numpy as np
+
+from vrp_data import DataVRP
+
+
+# Largest instance on which the dict version is timed by default:
+LEGACY_MAX_NODES = 1000
+
+
+def legacyCostMatrix(nodes):
+    # The way DataVRP.computeCostMatrix used to build the costs:
+    costs = {}
+    for (p1, (x1, y1)) in nodes.items():
+        for (p2, (x2, y2)) in nodes.items():
+            costs[p1, p2] = ((x1 - x2)**2 + (y1 - y2)**2)**0.5
+    return costs
+
+
+def timeIt(func, repeat=3):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def benchInstance(name, data, legacy=True):
+    tNew = timeIt(data.computeCostMatrix)
+    if not legacy:
+        print("%-14s %6d %12s %12.5f %10s" % (name, len(data.ids), "-", tNew, "-"))
+        return
+
+    tOld = timeIt(lambda: legacyCostMatrix(data.nodes), 1)
+    print("%-14s %6d %12.5f %12.5f %9.1fx" % (name, len(data.ids), tOld, tNew,
+                                              tOld/tNew))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--instances", default="./data/A-VRP/*.vrp")
+    parser.add_argument("--synthetic", type=int, nargs="*", default=[1000, 5000])
+    parser.add_argument("--legacy-large", action="store_true",
+                        help="Also time the dict version above %d nodes." % LEGACY_MAX_NODES)
+    args = parser.parse_args()
+
+    print("%-14s %6s %12s %12s %10s" % ("instance", "nodes", "dict (s)",
+                                        "numpy (s)", "speedup"))
+
+    for filename in sorted(glob.glob(args.instances)):
+        data = DataVRP(filename)
+        benchInstance(filename.split("/")[-1], data,
+                      legacy=args.legacy_large or len(data.ids) <= LEGACY_MAX_NODES)
+
+    rng = np.random.default_rng(0)
+    for n in args.synthetic:
+        data = DataVRP.fromArrays(rng.uniform(0, 1000, size=(n, 2)),
+                                  np.r_[0, rng.integers(1, 30, size=n - 1)], 100)
+        benchInstance("synthetic", data, legacy=args.legacy_large or n <= LEGACY_MAX_NODES)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,93 +4,251 @@ This is an implementantion for visualization of the mice pursuit problem.
 Each mouse starts at a different corner of a square. Each one is going to pursuit
 the mouse at its right with constant velocity. It is known that the path of
 each mouse is a logaritmic spiral.
+
+The simulation itself (PursuitSimulation) is headless and vectorized: the
+positions of all agents are one NumPy array, (N, 2), or (S, N, 2) for S
+independent scenarios advanced together. Any pursuit graph can be given
+as the index of the target of each agent (see cyclicTargets, chainTargets
+and randomTargets). pygame is only needed by the demo.
+
+Usage:
+    python pursuit.py [--agents 4]
+    python pursuit.py --headless --agents 100000 --steps 100
 '''
 
+import argparse
 import sys
-import pygame
+import time
+
+import numpy as np
+
+
+def cyclicTargets(n):
+    '''
+    Agent i pursues agent i + 1, and the last one the first (the mice).
+    '''
+    return (np.arange(n) + 1) % n
+
+
+def chainTargets(n):
+    '''
+    Agent i pursues agent i + 1, the last one pursues nobody (-1).
+    '''
+    targets = np.arange(1, n + 1)
+    targets[-1] = -1
+    return targets
 
 
-class MovingObject2D:
+def randomTargets(n, rng=None, scenarios=None):
     '''
-    I think pygame object do not support non integer positions so I made this
-    to make handle the positions.
+    Each agent pursues another one drawn at random.
+    @param scenarios - number of independent graphs, (scenarios, n) targets.
     '''
+    if n < 2:
+        raise ValueError("random pursuit needs at least two agents")
+
+    rng = np.random.default_rng(rng)
+    shape = (n,) if scenarios is None else (scenarios, n)
+    targets = rng.integers(n - 1, size=shape)
 
-    def __init__(self, initialPosition):
-        self.x = initialPosition[0]  # Vertical
-        self.y = initialPosition[1]  # Horizontal
-
-    def setPosition(self, newPosition):
-        self.x, self.y = newPosition
-
-    def getPosition(self):
-        return self.x, self.y
-
-    def getIntPosition(self):
-        return int(self.x), int(self.y)
-
-    def move(self, speed):
-        self.x += speed[0]
-        self.y += speed[1]
-
-
-def normalizeVector2D(vec):
-    normVec = float(vec[0]**2 + vec[1]**2)**0.5
-    if normVec <= 10e-4:  # Just preventing division by zero
-        normVec = 10e-4
-    return float(vec[0])/normVec, float(vec[1])/normVec
-
-pygame.init()
-
-size = width, height = 400, 400
-screen = pygame.display.set_mode(size)
-window_title = "Pursuit demo"
-pygame.display.set_caption(window_title)
-black = 0, 0, 0
-
-
-# Object one
-
-r0_obj1 = 0, height/2  # Initial position
-obj1 = MovingObject2D(r0_obj1)
-pygameObj1 = pygame.draw.circle(screen, (255, 0, 0), r0_obj1, 2)  # Drawing
-
-r0_obj2 = width/2, height - 1
-obj2 = MovingObject2D(r0_obj2)
-pygameObj2 = pygame.draw.circle(screen, (255, 255, 0), r0_obj2, 2)  # Drawing
-
-r0_obj3 = width - 1, height/2 - 1
-obj3 = MovingObject2D(r0_obj3)
-pygameObj2 = pygame.draw.circle(screen, (0, 255, 0), r0_obj3, 2)  # Drawing
-
-r0_obj4 = width/2 - 1, 0
-obj4 = MovingObject2D(r0_obj4)
-pygameObj2 = pygame.draw.circle(screen, (0, 255, 255), r0_obj4, 2)  # Drawing
-
-while True:
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            sys.exit()
-
-    # move object
-    pos1 = obj1.getPosition()
-    pos2 = obj2.getPosition()
-    pos3 = obj3.getPosition()
-    pos4 = obj4.getPosition()
-    speed_obj1 = normalizeVector2D((pos2[0] - pos1[0], pos2[1] - pos1[1]))
-    speed_obj2 = normalizeVector2D((pos3[0] - pos2[0], pos3[1] - pos2[1]))
-    speed_obj3 = normalizeVector2D((pos4[0] - pos3[0], pos4[1] - pos3[1]))
-    speed_obj4 = normalizeVector2D((pos1[0] - pos4[0], pos1[1] - pos4[1]))
-    obj1.move(speed_obj1)
-    obj2.move(speed_obj2)
-    obj3.move(speed_obj3)
-    obj4.move(speed_obj4)
-    pygame.time.delay(100)
-
-    # update image
-#    screen.fill(black)
-    pygame.draw.circle(screen, (255, 0, 0), obj1.getIntPosition(), 2)  # Drawing obj1
-    pygame.draw.circle(screen, (255, 255, 0), obj2.getIntPosition(), 2)  # Drawing obj1
-    pygame.draw.circle(screen, (0, 255, 0), obj3.getIntPosition(), 2)  # Drawing obj1
-    pygame.draw.circle(screen, (0, 255, 255), obj4.getIntPosition(), 2)  # Drawing obj1
-    pygame.display.flip()
+    # Skips the agent itself:
+    return targets + (targets >= np.arange(n))
+
+
+def polygonPositions(n, radius=1.0, center=(0.0, 0.0)):
+    '''
+    Vertices of a regular polygon, counterclockwise, the classic start of
+    the mice problem.
+    '''
+    angles = 2*np.pi*np.arange(n)/n
+    return np.column_stack([center[0] + radius*np.cos(angles),
+                            center[1] + radius*np.sin(angles)])
+
+
+class PursuitSimulation:
+    '''
+    Every step, each agent moves speed*dt towards the current position of
+    its target (all agents at once), without going past it. An agent whose
+    target is -1 stays still. A scenario ends when one agent gets within
+    captureRadius of its target (or all of them, with untilAll), its
+    agents stop and the step is stored in captureStep.
+    '''
+
+    # (..., N, 2) positions of the agents, the leading axes are
+    # the scenarios:
+    positions = None
+    # (N,) or (..., N) index of the target of each agent:
+    targets = None
+    # Step in which each scenario ended, -1 while running:
+    captureStep = None
+
+    def __init__(self, positions, targets, speeds=1.0, captureRadius=1.0,
+                 untilAll=False, record=False, recordEvery=1):
+        '''
+        @param positions - (N, 2) starting positions, or (S, N, 2).
+        @param targets - (N,) targets, shared by every scenario, or (S, N).
+        @param speeds - distance per unit of time, a scalar or anything
+        broadcasting to (S, N), e.g. (N,) per agent.
+        @param record - keep the positions every recordEvery steps, see
+        trajectory().
+        '''
+        self.positions = np.array(positions, dtype=np.float64)
+        n = self.positions.shape[-2]
+        targets = np.asarray(targets, dtype=np.int64)
+        if targets.shape[-1] != n or targets.min() < -1 or targets.max() >= n:
+            raise ValueError("targets must be N indices of agents or -1")
+
+        # Agents without a target pursue themselves, so they do not move:
+        self.pursuing = targets >= 0
+        self.targets = np.where(self.pursuing, targets, np.arange(n))
+        if self.targets.ndim > 1:
+            self.gatherIndex = np.broadcast_to(self.targets[..., np.newaxis],
+                                               self.positions.shape)
+
+        scenarios = self.positions.shape[:-2]
+        self.speeds = np.broadcast_to(np.asarray(speeds, dtype=np.float64),
+                                      scenarios + (n,))
+        self.captureRadius = captureRadius
+        self.untilAll = untilAll
+        self.steps = 0
+        self.time = 0.0
+        self.captureStep = np.full(scenarios, -1, dtype=np.int64)
+        self.captured = np.zeros(scenarios + (n,), dtype=bool)
+
+        self.recordEvery = recordEvery
+        self.history = [self.positions.copy()] if record else None
+        self.historySteps = [0] if record else None
+
+    def targetPositions(self):
+        if self.targets.ndim == 1:
+            return self.positions[..., self.targets, :]
+        return np.take_along_axis(self.positions, self.gatherIndex, axis=-2)
+
+    def running(self):
+        return self.captureStep < 0
+
+    def step(self, dt=1.0):
+        '''
+        Advances the running scenarios by dt.
+        @return - whether a scenario is still running.
+        '''
+        delta = self.targetPositions() - self.positions
+        distance = np.hypot(delta[..., 0], delta[..., 1])
+
+        # Captures are checked before moving, on the positions of the step:
+        self.captured |= self.pursuing & (distance <= self.captureRadius)
+        if self.untilAll:
+            ended = (self.captured | ~self.pursuing).all(axis=-1)
+        else:
+            ended = self.captured.any(axis=-1)
+        self.captureStep[ended & self.running()] = self.steps
+
+        running = self.running()
+        if not running.any():
+            return False
+
+        move = np.minimum(self.speeds*dt, distance)*running[..., np.newaxis]
+        np.divide(move, distance, out=move, where=distance > 0)
+        delta *= move[..., np.newaxis]
+        self.positions += delta
+
+        self.steps += 1
+        self.time += dt
+        if self.history is not None and self.steps % self.recordEvery == 0:
+            self.history.append(self.positions.copy())
+            self.historySteps.append(self.steps)
+
+        return True
+
+    def run(self, maxSteps, dt=1.0):
+        '''
+        Steps until every scenario ended or after maxSteps steps.
+        @return - the number of steps done.
+        '''
+        start = self.steps
+        while self.steps - start < maxSteps and self.step(dt):
+            pass
+
+        return self.steps - start
+
+    def trajectory(self):
+        '''
+        @return - the recorded steps and a (T, ..., N, 2) array with the
+        positions at each of them.
+        '''
+        if self.history is None:
+            raise ValueError("the simulation was not recording")
+        return np.array(self.historySteps), np.stack(self.history)
+
+
+def demo(n):
+    '''
+    The mice on a 400x400 window, drawn step by step.
+    '''
+    import pygame
+
+    pygame.init()
+
+    size = width, height = 400, 400
+    screen = pygame.display.set_mode(size)
+    window_title = "Pursuit demo"
+    pygame.display.set_caption(window_title)
+
+    if n == 4:
+        # The original start, the middle of each side:
+        start = [(0, height/2), (width/2, height - 1), (width - 1, height/2 - 1), (width/2 - 1, 0)]
+    else:
+        start = polygonPositions(n, min(width, height)/2 - 1, (width/2, height/2))
+    simulation = PursuitSimulation(start, cyclicTargets(n))
+
+    colors = [(255, 0, 0), (255, 255, 0), (0, 255, 0), (0, 255, 255)]
+    while True:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                sys.exit()
+
+        simulation.step()
+        pygame.time.delay(100)
+
+        for i, position in enumerate(simulation.positions.astype(int)):
+            pygame.draw.circle(screen, colors[i % len(colors)], position.tolist(), 2)
+        pygame.display.flip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agents", type=int, default=4)
+    parser.add_argument("--headless", action="store_true",
+                        help="Only simulate, printing the steps per second.")
+    parser.add_argument("--scenarios", type=int, default=None,
+                        help="Independent scenarios of the headless run.")
+    parser.add_argument("--steps", type=int, default=1000)
+    parser.add_argument("--capture-radius", type=float, default=0.0,
+                        help="Capture radius of the headless run, in sides of the polygon.")
+    args = parser.parse_args()
+
+    if not args.headless:
+        demo(args.agents)
+        return
+
+    # Speed and capture radius scale with the side, which is tiny with many
+    # agents (the default radius of 1 would end the run before it starts):
+    radius = 100.0
+    side = 2*radius*np.sin(np.pi/args.agents)
+    start = polygonPositions(args.agents, radius)
+    if args.scenarios:
+        start = np.broadcast_to(start, (args.scenarios,) + start.shape)
+    simulation = PursuitSimulation(start, cyclicTargets(args.agents), speeds=side/100,
+                                   captureRadius=args.capture_radius*side)
+
+    clock = time.time()
+    steps = simulation.run(args.steps)
+    elapsed = time.time() - clock
+    print("%d steps of %d agents in %.3f s (%.0f steps/s), %d scenarios still running" % (
+        steps, simulation.positions[..., 0].size, elapsed, steps/max(elapsed, 1e-9),
+        simulation.running().sum()))
+
+
+if __name__ == "__main__":
+    main()
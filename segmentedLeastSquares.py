@@ -6,33 +6,146 @@ Book author's: Jon Kleinberg, Eva Tardos.
 I do not ensure this works properly.
 '''
 
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
-import matplotlib.pyplot as plt
-from math import sin
 
 
 def getLeastSquareError(points):
-
+    '''
+    Least square error of the line fitted to all the points, see
+    segmentErrors.
+    '''
     if len(points) <= 2:
         return 0.0
 
-    X = []
-    Y = []
-    for p in points:
-        X.append(p[0])
-        Y.append(p[1])
+    sums = prefixSums(points)
+    return float(segmentErrors(sums, 0, len(points) - 1))
+
+
+def prefixSums(points):
+    '''
+    Cumulative sums of 1, x, y, x^2, y^2 and xy, with a leading zero, so
+    the sums over points[i:j+1] are sums[:, j + 1] - sums[:, i]. The points
+    are centered first to limit the cancellation in segmentErrors.
+    @param points - (n, 2) points, or (..., n, 2) for several series.
+    @return - a (6, n + 1) array, or (6, ..., n + 1).
+    '''
+    points = np.asarray(points, dtype=np.float64)
+    x = points[..., 0] - points[..., 0].mean(axis=-1, keepdims=True)
+    y = points[..., 1] - points[..., 1].mean(axis=-1, keepdims=True)
 
-    ret = np.polyfit(X, Y, deg=1, full=True)
-    return ret[1][0]
+    terms = np.stack([np.ones_like(x), x, y, x*x, y*y, x*y])
+    sums = np.zeros(terms.shape[:-1] + (terms.shape[-1] + 1,))
+    np.cumsum(terms, axis=-1, out=sums[..., 1:])
 
+    return sums
 
-def findSegments(e, M, n, cost):
-    if n == 0:
-        return []
 
-    minIndex = np.argmin([e[i, n-1] + cost + M[i-1] for i in range(n)])
+def segmentErrors(sums, i, j):
+    '''
+    Least square error of the line fitted to points[i:j+1], in O(1) from
+    the prefix sums. i and j may be arrays (broadcast together), e.g.
+    segmentErrors(sums, np.arange(j + 1), j) is a column of the error table.
+    '''
+    i, j = np.broadcast_arrays(i, j)
+    return errorsFromSums(sums[:, j + 1] - sums[:, i])
+
+
+def columnErrors(sums, j):
+    '''
+    Same as segmentErrors(sums, np.arange(j + 1), j), with slices only.
+    Works on the sums of several series too.
+    '''
+    return errorsFromSums(sums[..., j + 1, np.newaxis] - sums[..., :j + 1])
+
+
+def errorsFromSums(segmentSums):
+    k, sx, sy, sxx, syy, sxy = segmentSums
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        varX = sxx - sx*sx/k
+        varY = syy - sy*sy/k
+        cov = sxy - sx*sy/k
+        error = np.where(varX > 0, varY - cov*cov/varX, varY)
+
+    # Segments of one or two points are fitted exactly:
+    return np.where(k > 2, np.maximum(error, 0.0), 0.0)
+
+
+def segmentLines(sums, i, j):
+    '''
+    Slope and intercept of the lines fitted to points[i:j+1], in the
+    centered coordinates of prefixSums. A single point gets slope 0.
+    '''
+    i, j = np.broadcast_arrays(i, j)
+    return linesFromSums(sums[:, j + 1] - sums[:, i])
 
-    return [range(minIndex, n)] + findSegments(e, M, minIndex, cost)
+
+def linesFromSums(segmentSums):
+    k, sx, sy, sxx, _, sxy = segmentSums
+
+    varX = sxx - sx*sx/k
+    cov = sxy - sx*sy/k
+    slope = np.divide(cov, varX, out=np.zeros_like(cov), where=varX > 0)
+
+    return slope, (sy - slope*sx)/k
+
+
+def findSegments(back, n):
+    '''
+    Follows the back-pointers of the DP from the last point.
+    @return - the (start, end) indices of the segments, from the first.
+    '''
+    segments = []
+    while n > 0:
+        start = int(back[n - 1])
+        segments.append((start, n - 1))
+        n = start
+
+    return segments[::-1]
+
+
+def segmentPointers(sums, cost, errors=None):
+    '''
+    The DP of the algorithm. M[j + 1] is the optimal cost of points[0:j+1]
+    (M[0] = 0) and back[j] is the first point of the last segment of that
+    solution. The errors e(i, j) come from prefix sums (see segmentErrors)
+    and are computed one column j at a time, so the DP takes O(n^2) time
+    and O(n) memory instead of storing the n^2/2 error table. With the
+    sums of several series of the same length, they are all solved at
+    once.
+    @param errors - the columns of the error table (see errorColumns), to
+    reuse them over several costs.
+    @return - the back-pointers, (n,) or (..., n).
+    '''
+    n = sums.shape[-1] - 1
+    M = np.zeros(sums.shape[1:-1] + (n + 1,))
+    back = np.zeros(sums.shape[1:-1] + (n,), dtype=np.int64)
+
+    for j in range(n):
+        column = columnErrors(sums, j) if errors is None else errors[j]
+        candidates = column + cost + M[..., :j + 1]
+        back[..., j] = np.argmin(candidates, axis=-1)
+        M[..., j + 1] = candidates.min(axis=-1)
+
+    return back
+
+
+def errorColumns(sums):
+    '''
+    The error table, as the list of its columns e(0..j, j).
+    '''
+    return [columnErrors(sums, j) for j in range(sums.shape[-1] - 1)]
+
+
+def optimalSegments(sums, cost, errors=None):
+    '''
+    @return - the (start, end) indices of the segments, see findSegments.
+    '''
+    return findSegments(segmentPointers(sums, cost, errors), sums.shape[-1] - 1)
 
 
 def segmentedLeastSquares(points, cost):
@@ -47,46 +160,574 @@ def segmentedLeastSquares(points, cost):
     each element of the list is itself a list with the indices of the items in
     'points' list that are approximated by one linear segment.
     '''
+    if len(points) == 0:
+        return []
+
+    segments = optimalSegments(prefixSums(points), cost)
+
+    return [range(start, end + 1) for start, end in segments]
+
+
+# Fields of the segments returned by segmentedFit. end is the index of the
+# last point of the segment:
+SEGMENT_DTYPE = np.dtype([("start", np.int64), ("end", np.int64), ("slope", np.float64),
+                          ("intercept", np.float64), ("sse", np.float64)])
+
+
+def segmentedFit(points, cost):
+    '''
+    Same as segmentedLeastSquares, but returns the fitted lines.
+    @return - a structured array (see SEGMENT_DTYPE) with one row per
+    segment: its first and last point, the line y = slope*x + intercept
+    and its least square error.
+    '''
+    if len(points) == 0:
+        return np.zeros(0, dtype=SEGMENT_DTYPE)
+
+    sums = prefixSums(points)
+    means = np.asarray(points, dtype=np.float64).mean(axis=0)
+
+    return fitSegments(sums, optimalSegments(sums, cost), means)
+
+
+def fitSegments(sums, segments, means):
+    '''
+    Builds the SEGMENT_DTYPE rows of the (start, end) segments.
+    @param means - (meanX, meanY) of the points, as the sums are centered.
+    '''
+    segments = np.array(segments, dtype=np.int64).reshape(-1, 2)
+    start, end = segments[:, 0], segments[:, 1]
+    meanX, meanY = means
+    slope, intercept = segmentLines(sums, start, end)
+
+    fit = np.zeros(len(segments), dtype=SEGMENT_DTYPE)
+    fit["start"], fit["end"] = start, end
+    fit["slope"] = slope
+    fit["intercept"] = meanY + intercept - slope*meanX
+    fit["sse"] = segmentErrors(sums, start, end)
+
+    return fit
+
+
+def penaltyPath(points, minCost, maxCost=None, cacheLimit=4000):
+    '''
+    Every optimal segmentation for a cost in [minCost, maxCost], with
+    CROPS (Haynes, Eckley, Fearnhead, 2017). A segmentation with m
+    segments and error Q has a total cost Q + m*cost, a line in the cost,
+    so the optimal cost is their lower envelope. Given the solutions at
+    two costs, their lines cross at (Q1 - Q0)/(m0 - m1): if the solution
+    at that cost is one of the two, there is nothing between them,
+    otherwise both halves are searched. It takes about two solves per
+    segmentation on the path instead of a sweep over the costs.
+    @param maxCost - by default a cost above the error of a single
+    segment, so the path ends with one segment.
+    @param cacheLimit - up to this number of points the error table is
+    computed once and shared by the solves (n^2/2 floats), beyond it each
+    solve recomputes it from the prefix sums.
+    @return - a list of (minCost, maxCost, fit), by increasing cost, where
+    fit (see segmentedFit) is optimal for every cost of [minCost, maxCost].
+    '''
+    if len(points) == 0:
+        return [(minCost, np.inf if maxCost is None else maxCost,
+                 np.zeros(0, dtype=SEGMENT_DTYPE))]
 
+    sums = prefixSums(points)
+    means = np.asarray(points, dtype=np.float64).mean(axis=0)
+    errors = errorColumns(sums) if len(points) <= cacheLimit else None
+
+    if maxCost is None:
+        # m segments cost at least m*maxCost > error + maxCost:
+        maxCost = max(minCost, float(segmentErrors(sums, 0, len(points) - 1)) + 1.0)
+
+    solutions = {}  # number of segments -> fit
+
+    def solve(cost):
+        fit = fitSegments(sums, optimalSegments(sums, cost, errors), means)
+        solutions.setdefault(len(fit), fit)
+        return len(fit), fit["sse"].sum()
+
+    intervals = [(solve(minCost), solve(maxCost))]
+    while intervals:
+        (m0, q0), (m1, q1) = intervals.pop()
+        if m0 <= m1 + 1:
+            continue
+
+        m, q = solve((q1 - q0)/(m0 - m1))
+        if m != m0 and m != m1:
+            intervals.append(((m0, q0), (m, q)))
+            intervals.append(((m, q), (m1, q1)))
+
+    # Costs where the lines of consecutive solutions cross:
+    fits = [solutions[m] for m in sorted(solutions, reverse=True)]
+    sse = [fit["sse"].sum() for fit in fits]
+    bounds = [minCost] + [max(minCost, min(maxCost, (sse[k + 1] - sse[k]) /
+                                           (len(fits[k]) - len(fits[k + 1]))))
+                          for k in range(len(fits) - 1)] + [maxCost]
+
+    return [(bounds[k], bounds[k + 1], fit) for k, fit in enumerate(fits)]
+
+
+def noiseVariance(points):
+    '''
+    Variance of the noise of a piecewise linear signal, from the distance
+    of each point to the line through its two neighbours, which is only
+    noise away from the breakpoints. The median absolute value is used, so
+    the few points at the breakpoints do not count.
+    '''
+    points = np.asarray(points, dtype=np.float64)
+    if len(points) < 3:
+        return 0.0
+
+    x, y = points[:, 0], points[:, 1]
+    span = x[2:] - x[:-2]
+    w = np.divide(x[2:] - x[1:-1], span, out=np.full(len(span), 0.5), where=span > 0)
+    residual = (y[1:-1] - w*y[:-2] - (1 - w)*y[2:])/np.sqrt(1 + w*w + (1 - w)**2)
+    sigma = np.median(np.abs(residual))/0.6745
+
+    return sigma*sigma
+
+
+def bicSegmentation(path, points, noise=None):
+    '''
+    Picks the segmentation of a penaltyPath with the lowest Bayesian
+    information criterion for Gaussian noise of known variance,
+    SSE/noise + p*log(n), where p = 3m - 1 for m segments (a slope and an
+    intercept per segment and m - 1 breakpoints). With the variance
+    estimated once, segments of one or two points, whose error is 0, are
+    not rewarded for it as with n*log(SSE/n).
+    @param noise - variance of the noise, noiseVariance(points) by default.
+    @return - the (minCost, maxCost, fit) entry of the path.
+    '''
     n = len(points)
-    e = {}
+    if noise is None:
+        noise = noiseVariance(points)
+    if n:
+        # Noiseless points: only a floor, so SSE/noise stays finite:
+        spread = np.asarray(points, dtype=np.float64)[:, 1].var()
+        noise = max(noise, 1e-12*spread, 1e-300)
 
-    M = {}
-    M[-1] = 0
+    def bic(entry):
+        fit = entry[2]
+        if n == 0:
+            return 0.0
+        return fit["sse"].sum()/noise + (3*len(fit) - 1)*np.log(n)
 
-    for j in range(n):
-        for i in range(j+1):
-            e[i, j] = getLeastSquareError(points[i:j+1])
+    return min(path, key=bic)
 
-    for j in range(n):
-        minCandidates = []
-        for i in range(j+1):
-            minCandidates.append(e[i, j] + cost + M[i-1])
 
-            if len(minCandidates) > 0:
-                M[j] = min(minCandidates)
+def elbowSegmentation(path, points, minLength=3, maxSegments=None):
+    '''
+    Picks the segmentation of a penaltyPath at the elbow of the error
+    against the number of segments: the point farthest from the chord
+    between one segment and the finest segmentation of the path with at
+    most maxSegments segments, both axes scaled to [0, 1]. The one segment
+    end is always used, even if the path stops before it. Only the
+    segmentations whose segments all have at least minLength points can
+    be picked. The other end of the chord depends on the minCost of the
+    path, and so does the elbow: give a minCost small enough to go well
+    past the expected number of segments.
+    @return - the (minCost, maxCost, fit) entry of the path.
+    '''
+    entries = [entry for entry in path
+               if len(entry[2]) and (maxSegments is None or len(entry[2]) <= maxSegments)]
+    if not entries:
+        return path[-1]
+
+    m = np.array([len(fit) for _, _, fit in entries], dtype=np.float64)
+    sse = np.array([fit["sse"].sum() for _, _, fit in entries])
+    accepted = np.array([(fit["end"] - fit["start"] + 1).min() >= minLength
+                         for _, _, fit in entries])
+    if not accepted.any():
+        return entries[int(np.argmin(m))]
+
+    # The chord goes from one segment to the finest segmentation:
+    first = np.array([1.0, getLeastSquareError(points)])
+    last = np.array([m.max(), sse[np.argmax(m)]])
+    scale = np.maximum(np.abs(first - last), 1e-300)
+    m = (m - last[0])/scale[0]
+    sse = (sse - last[1])/scale[1]
+    dm, ds = (first - last)/scale
+
+    distance = np.abs(dm*sse - ds*m)/np.hypot(dm, ds)
+    distance[~accepted] = -1.0
+
+    return entries[int(np.argmax(distance))]
+
+
+# Fields of the segments returned by segmentBatch, series is the index of
+# the series of the segment:
+BATCH_DTYPE = np.dtype([("series", np.int64)] + SEGMENT_DTYPE.descr)
+
+# Points of the series shared with the pool workers, see attachSharedPoints:
+sharedMemory = None
+sharedPoints = None
+
+
+def batchFit(series, start, end, segmentSums, means):
+    '''
+    Builds the BATCH_DTYPE rows of segments from their sums (as in
+    prefixSums, centered on the means (meanX, meanY) of their series).
+    '''
+    slope, intercept = linesFromSums(segmentSums)
+
+    fit = np.zeros(len(series), dtype=BATCH_DTYPE)
+    fit["series"], fit["start"], fit["end"] = series, start, end
+    fit["slope"] = slope
+    fit["intercept"] = means[1] + intercept - slope*means[0]
+    fit["sse"] = errorsFromSums(segmentSums)
+
+    return fit
+
+
+def fitEqualLength(points, cost, indices):
+    '''
+    Segments series of the same length at once, see segmentPointers.
+    @param points - (m, n, 2) points of m series.
+    @param indices - (m,) index of each series in the output.
+    '''
+    m, n = points.shape[:2]
+    sums = prefixSums(points)
+    back = segmentPointers(sums, cost)
+
+    segments = np.array([(s, start, end) for s in range(m)
+                         for start, end in findSegments(back[s], n)], dtype=np.int64)
+    s, start, end = segments.T
+    means = points[s].mean(axis=1).T
+
+    return batchFit(indices[s], start, end, sums[:, s, end + 1] - sums[:, s, start], means)
+
+
+def attachSharedPoints(name, shape):
+    '''
+    Initializer of the pool workers: maps the shared points.
+    '''
+    global sharedMemory, sharedPoints
+    from multiprocessing import shared_memory
+
+    sharedMemory = shared_memory.SharedMemory(name=name)
+    sharedPoints = np.ndarray(shape, dtype=np.float64, buffer=sharedMemory.buf)
+
+
+def fitSeries(index, points, cost):
+    '''
+    Segments one series, whose segments are labelled with index.
+    '''
+    sums = prefixSums(points)
+    segments = np.array(optimalSegments(sums, cost), dtype=np.int64)
+    start, end = segments.T
+
+    return batchFit(np.full(len(segments), index), start, end,
+                    sums[:, end + 1] - sums[:, start], points.mean(axis=0))
+
+
+def fitSharedSeries(tasks, cost):
+    '''
+    Segments the series (index, offset, length) of sharedPoints, each
+    one in points[offset:offset + length].
+    '''
+    parts = [fitSeries(index, sharedPoints[offset:offset + length], cost)
+             for index, offset, length in tasks]
+
+    return np.concatenate(parts) if parts else np.zeros(0, dtype=BATCH_DTYPE)
+
+
+def fitInPool(series, indices, cost, workers):
+    '''
+    Segments the given series with a pool of workers. The points are
+    copied once to shared memory, the tasks only carry offsets.
+    '''
+    from multiprocessing import shared_memory
+
+    lengths = np.array([len(series[i]) for i in indices])
+    offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+
+    memory = shared_memory.SharedMemory(create=True, size=max(1, 16*int(lengths.sum())))
+    try:
+        points = np.ndarray((int(lengths.sum()), 2), dtype=np.float64, buffer=memory.buf)
+        for i, offset, length in zip(indices, offsets, lengths):
+            points[offset:offset + length] = series[i]
+
+        # Longest series first, dealt round-robin to balance the chunks:
+        tasks = sorted(zip(indices.tolist(), offsets.tolist(), lengths.tolist()),
+                       key=lambda task: -task[2])
+        nChunks = min(len(tasks), 4*workers)
+        chunks = [tasks[k::nChunks] for k in range(nChunks)]
+
+        with ProcessPoolExecutor(workers, initializer=attachSharedPoints,
+                                 initargs=(memory.name, points.shape)) as pool:
+            parts = list(pool.map(fitSharedSeries, chunks, [cost]*len(chunks)))
+        del points
+    finally:
+        memory.close()
+        memory.unlink()
+
+    return parts
+
+
+def segmentBatch(series, cost, x=None, workers=None, blockSize=1 << 20):
+    '''
+    Segments many series at once.
+    @param series - a 2-D array (m, n) with the y values of m series (x
+    given by the x parameter, 0..n-1 by default), a 3-D array (m, n, 2)
+    of points, or a list of series of any lengths, each one a list of
+    points (x, y) or a 1-D array of y values.
+    @param workers - processes of the pool, os.cpu_count() by default;
+    0 or 1 solves everything in this process.
+    @param blockSize - maximum number of points solved at once by the
+    vectorized DP.
+    @return - a structured array (see BATCH_DTYPE) with the segments of
+    every series, sorted by series and start.
+
+    Series of the same length are solved together, vectorized over the
+    series (see segmentPointers). Series with a length of their own go
+    to the process pool.
+    '''
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if isinstance(series, np.ndarray) and series.ndim == 2:
+        xs = np.arange(series.shape[1]) if x is None else np.asarray(x)
+        series = np.stack(np.broadcast_arrays(xs, series), axis=-1)
+
+    if isinstance(series, np.ndarray) and series.ndim == 3:
+        groups = {series.shape[1]: np.arange(len(series))}
+    else:
+        series = [np.asarray(points, dtype=np.float64) for points in series]
+        series = [np.column_stack([np.arange(len(points)), points]) if points.ndim == 1
+                  else points.reshape(-1, 2) for points in series]
+
+        groups = {}
+        for i, points in enumerate(series):
+            groups.setdefault(len(points), []).append(i)
+        groups = {n: np.array(indices) for n, indices in groups.items()}
+
+    parts, alone = [], []
+    for n, indices in groups.items():
+        if n == 0:
+            continue
+        if len(indices) == 1:
+            alone.append(indices[0])
+            continue
+
+        block = max(1, blockSize//n)
+        for k in range(0, len(indices), block):
+            chunk = indices[k:k + block]
+            points = series[chunk] if isinstance(series, np.ndarray) \
+                else np.stack([series[i] for i in chunk])
+            parts.append(fitEqualLength(points, cost, chunk))
+
+    if alone:
+        alone = np.array(alone)
+        if workers > 1 and len(alone) > 1:
+            parts.extend(fitInPool(series, alone, cost, min(workers, len(alone))))
+        else:
+            parts.extend(fitSeries(i, series[i], cost) for i in alone.tolist())
+
+    if not parts:
+        return np.zeros(0, dtype=BATCH_DTYPE)
+
+    fit = np.concatenate(parts)
+    return fit[np.lexsort((fit["start"], fit["series"]))]
+
+
+class OnlineSegmenter:
+    '''
+    Segmented least squares over a stream of points, in arrival order.
+    The optimal cost M of the points seen so far is extended one point at
+    a time, with PELT pruning (Killick et al., 2012): a start i is dropped
+    from the candidates of the last segment once
+    M[i] + e(i, j) > M[j + 1], as it can never be better again. Each
+    candidate keeps its own sums (shifted by the first point it saw), so
+    the work per point is proportional to the number of candidates.
+
+    Each point j adds a node j + 1 whose parent is the start of the last
+    segment of the optimal solution of points[0:j+1]. Nodes that are no
+    longer candidates and have no children are removed. When the oldest
+    node is not a candidate and has a single child, every future solution
+    goes through that child, so the segment between them is final and is
+    emitted. The memory is bounded by the candidates and their ancestors,
+    not by the length of the series.
+    '''
+
+    def __init__(self, cost):
+        '''
+        @param cost - cost of adding a new segment, as in segmentedLeastSquares.
+        '''
+        self.cost = cost
+        self.n = 0  # Points seen
+
+        # Candidates for the start of the last segment, their optimal cost
+        # M, the point their sums are shifted by and the sums themselves:
+        self.starts = np.zeros(1, dtype=np.int64)
+        self.M = np.zeros(1)
+        self.origins = np.zeros((2, 1))
+        self.sums = np.zeros((6, 1))
+
+        # Node start -> [parent, children, fit of the segment
+        # (parent, start - 1), whether it is a candidate]:
+        self.nodes = {0: [None, set(), None, True]}
+        self.root = 0
+
+    def add(self, x, y):
+        '''
+        Adds the next point.
+        @return - the segments that became final (see SEGMENT_DTYPE).
+        '''
+        j = self.n
+        self.n += 1
+        if j == 0:
+            self.origins[:, 0] = x, y
+
+        dx = x - self.origins[0]
+        dy = y - self.origins[1]
+        self.sums += np.vstack([np.ones_like(dx), dx, dy, dx*dx, dy*dy, dx*dy])
+
+        errors = errorsFromSums(self.sums)
+        candidates = self.M + errors
+        best = int(np.argmin(candidates))
+        M = candidates[best] + self.cost
+
+        # The new node and the fit of its last segment:
+        slope, intercept = linesFromSums(self.sums[:, best])
+        originX, originY = self.origins[:, best]
+        parent = int(self.starts[best])
+        self.nodes[j + 1] = [parent, set(), (parent, j, slope,
+                                             originY + intercept - slope*originX, errors[best]),
+                             True]
+        self.nodes[parent][1].add(j + 1)
+
+        # PELT pruning, then the new candidate:
+        keep = candidates <= M
+        for start in self.starts[~keep].tolist():
+            self.release(start)
+
+        self.starts = np.append(self.starts[keep], j + 1)
+        self.M = np.append(self.M[keep], M)
+        self.origins = np.hstack([self.origins[:, keep], [[x], [y]]])
+        self.sums = np.hstack([self.sums[:, keep], np.zeros((6, 1))])
+
+        return self.finalSegments()
+
+    def addChunk(self, points):
+        '''
+        Adds a chunk of points (x, y).
+        @return - the segments that became final.
+        '''
+        segments = [self.add(x, y) for x, y in np.asarray(points, dtype=np.float64)]
+        return np.concatenate(segments) if segments else np.zeros(0, dtype=SEGMENT_DTYPE)
+
+    def release(self, start):
+        '''
+        Marks a node as no longer a candidate and removes it, and then its
+        ancestors, while they are not candidates and have no children.
+        '''
+        node = self.nodes[start]
+        node[3] = False
+        while not node[1] and not node[3] and start != self.root:
+            del self.nodes[start]
+            parent = self.nodes[node[0]]
+            parent[1].discard(start)
+            start, node = node[0], parent
+
+    def finalSegments(self):
+        segments = []
+        root = self.nodes[self.root]
+        while len(root[1]) == 1 and not root[3]:
+            child, = root[1]
+            del self.nodes[self.root]
+            self.root, root = child, self.nodes[child]
+            segments.append(root[2])
+            root[0], root[2] = None, None
+
+        return np.array(segments, dtype=SEGMENT_DTYPE)
+
+    def flush(self):
+        '''
+        Ends the stream.
+        @return - the segments of the optimal solution that were not
+        emitted yet.
+        '''
+        segments = []
+        start = self.n
+        while start != self.root:
+            node = self.nodes[start]
+            segments.append(node[2])
+            start = node[0]
+
+        self.__init__(self.cost)
+        return np.array(segments[::-1], dtype=SEGMENT_DTYPE)
+
+
+def segmentStream(stream, cost, chunks=False):
+    '''
+    Segments a stream of points (x, y), or of chunks of points when chunks
+    is True, with an OnlineSegmenter.
+    @return - a generator of the segments (see SEGMENT_DTYPE), each one as
+    soon as it is final.
+    '''
+    segmenter = OnlineSegmenter(cost)
+    for item in stream:
+        segments = segmenter.addChunk(item) if chunks else segmenter.add(*item)
+        for segment in segments:
+            yield segment
+
+    for segment in segmenter.flush():
+        yield segment
+
+
+def checkSelection(seed=0):
+    '''
+    Regression check of the model selection: noisy piecewise linear
+    signals with a known number of segments, over paths starting at
+    several minCost, must be recovered by both rules. The elbow is only
+    checked on paths going well past that number (see elbowSegmentation).
+    @return - the list of failures, empty if none.
+    '''
+    rng = np.random.default_rng(seed)
+    x = np.arange(300.0)
+    signals = [(2, np.where(x < 150, x, 300 - x)),
+               (3, np.select([x < 100, x < 200], [x, 200 - x], 0.5*x - 100))]
+
+    failures = []
+    for segments, y in signals:
+        for sd in (0.5, 2.0, 5.0):
+            points = np.column_stack([x, y + rng.normal(0, sd, len(x))])
+            for minCost in (1e-3, 1.0, 10.0):
+                path = penaltyPath(points, minCost)
+                rules = [("bic", bicSegmentation)]
+                if len(path[0][2]) >= 3*segments:
+                    rules.append(("elbow", elbowSegmentation))
+
+                for rule, select in rules:
+                    found = len(select(path, points)[2])
+                    if found != segments:
+                        failures.append((rule, segments, sd, minCost, found))
 
-    lines = findSegments(e, M, n, cost)
-    lines.sort(key=lambda line: line[0])
+    return failures
 
-    return lines
 
+if __name__ == "__main__":
+    if "--check" in sys.argv:
+        failures = checkSelection()
+        for rule, segments, sd, minCost, found in failures:
+            print("%s: %d segments instead of %d (noise %g, minCost %g)" % (
+                rule, found, segments, sd, minCost))
+        print("%d failures" % len(failures))
+        sys.exit(1 if failures else 0)
 
-# Here's a small example:
-xAxis = np.arange(0, 2*3.1416, 0.1)
-points = [(x, sin(x))
-          for i, x in enumerate(xAxis)]
+    # Here's a small example:
+    import matplotlib.pyplot as plt
 
-lines = segmentedLeastSquares(points, 1)
+    xAxis = np.arange(0, 2*3.1416, 0.1)
+    points = [(x, np.sin(x)) for x in xAxis]
 
-linesToConnect = [[lines[i-1][-1], lines[i][0]] for i in range(1, len(lines))]
+    fit = segmentedFit(points, 1)
 
-for line in lines + linesToConnect:
-    x = [xAxis[line[0]], xAxis[line[-1]]]
-    y = [points[line[0]][1], points[line[-1]][1]]
-    print x
-    plt.plot(x, y, linewidth=2, color='r')
+    for segment in fit:
+        x = np.array([xAxis[segment["start"]], xAxis[segment["end"]]])
+        print(x)
+        plt.plot(x, segment["slope"]*x + segment["intercept"], linewidth=2, color='r')
 
-plt.scatter([z[0] for z in points], [z[1] for z in points])
-plt.tick_params(axis='both', which='major', labelsize=16)
-plt.show()
+    plt.scatter([z[0] for z in points], [z[1] for z in points])
+    plt.tick_params(axis='both', which='major', labelsize=16)
+    plt.show()
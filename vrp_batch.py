@@ -0,0 +1,313 @@
+'''
+Headless batch solver for many VRP instances. Each instance is solved in
+its own worker process, at most --workers at a time, so a crash, a memory
+blow-up or a hung solve only loses that instance. Results are appended to
+a JSONL or CSV file (chosen by the extension of --output) as soon as each
+instance finishes.
+
+Models:
+    mtz    - vrp_scip_poly.VRPSolver (MTZ formulation with capacity cuts)
+    cg     - vrp_scip_cg.VRPsolver, LP relaxation by column generation
+    bp     - vrp_scip_cg.VRPsolver, branch-and-price
+    basic  - vrp_scip.VRPsolver, LP relaxation by column generation
+
+The LP relaxations (cg, basic) only give a bound, stored in lpBound, and
+leave objective and gap empty.
+
+Usage:
+    python vrp_batch.py data/A-VRP --model cg --workers 4 --time-limit 600 \\
+        --threads 1 --memory 4096 --output results.jsonl
+'''
+
+import argparse
+import csv
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from multiprocessing.connection import wait
+
+
+# Columns of the result records (and of the CSV file):
+FIELDS = ["instance", "file", "model", "status", "objective", "bound", "gap", "lpBound",
+          "time", "nodes", "columns", "error"]
+
+# Models solving only the LP relaxation:
+LP_MODELS = ("cg", "basic")
+
+
+def findInstances(paths):
+    '''
+    @param paths - instance files, directories (every *.vrp inside) or globs.
+    @return - the sorted list of instance files.
+    '''
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(glob.glob(os.path.join(path, "*.vrp")))
+        elif os.path.exists(path):
+            files.append(path)
+        else:
+            files.extend(glob.glob(path))
+
+    return sorted(set(files))
+
+
+def limitWorker(threads, memory, logFile):
+    '''
+    Settings of a worker process, applied before any solver module is
+    imported: headless plotting, the number of BLAS threads, the address
+    space limit and the redirection of the output (SCIP writes to the
+    file descriptors directly).
+    '''
+    os.environ["MPLBACKEND"] = "Agg"
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(threads)
+
+    if memory:
+        import resource
+        limit = memory*1024*1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    fd = os.open(logFile or os.devnull, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.dup2(fd, 1)
+    os.dup2(fd, 2)
+    os.close(fd)
+
+
+def solveInstance(filename, model, timeLimit, threads, memory, options):
+    '''
+    Solves one instance in the current process.
+    @return - a result record (see FIELDS).
+    '''
+    from vrp_data import DataVRP
+
+    start = time.time()
+    data = DataVRP(filename)
+
+    params = {"limits/time": float(timeLimit), "lp/threads": threads}
+    if memory:
+        # SCIP stops by itself a bit before the hard limit:
+        params["limits/memory"] = 0.8*memory
+
+    columns = None
+    if model == "mtz":
+        from vrp_scip_poly import VRPSolver
+        solver = VRPSolver(data)
+        solver.scipParams = params
+        solver.solve(timeLimit, neighbours=options["neighbours"])
+        scip = solver.model
+    elif model in ("cg", "bp"):
+        from vrp_scip_cg import VRPsolver
+        solver = VRPsolver(data, options["maxPatterns"], pricing=options["pricing"],
+                           neighbours=options["neighbours"])
+        solver.scipParams = params
+        solver.solve(branchAndPrice=model == "bp")
+        scip = solver.master
+        columns = len(solver.patterns)
+    elif model == "basic":
+        from vrp_scip import VRPsolver
+        solver = VRPsolver(data, options["maxPatterns"])
+        solver.scipParams = params
+        solver.solve()
+        scip = solver.master
+        columns = len(solver.patterns)
+    else:
+        raise ValueError("Unknown model: %s" % model)
+
+    result = {"status": scip.getStatus(),
+              "time": time.time() - start,
+              "nodes": scip.getNNodes(),
+              "columns": columns}
+    if model in LP_MODELS:
+        # The solution is fractional, its value is a lower bound:
+        result["lpBound"] = scip.getObjVal() if scip.getNSols() else None
+    else:
+        result.update({"objective": scip.getPrimalbound() if scip.getNSols() else None,
+                       "bound": scip.getDualbound(),
+                       "gap": scip.getGap() if scip.getNSols() else None})
+
+    return result
+
+
+def worker(conn, solve, filename, model, timeLimit, threads, memory, logFile, options):
+    limitWorker(threads, memory, logFile)
+    try:
+        result = solve(filename, model, timeLimit, threads, memory, options)
+    except MemoryError:
+        result = {"status": "memory", "error": "MemoryError"}
+    except Exception:
+        result = {"status": "error", "error": traceback.format_exc()}
+
+    conn.send(result)
+    conn.close()
+
+
+class ResultWriter:
+    '''
+    Writes the result records to a JSONL file, or to a CSV file when the
+    name ends with .csv, flushing after each record.
+    '''
+
+    def __init__(self, filename, fields=FIELDS):
+        self.fd = open(filename, "w", newline="")
+        self.csv = None
+        if filename.endswith(".csv"):
+            self.csv = csv.DictWriter(self.fd, fields)
+            self.csv.writeheader()
+
+    def write(self, result):
+        if self.csv is not None:
+            self.csv.writerow(result)
+        else:
+            self.fd.write(json.dumps(result) + "\n")
+        self.fd.flush()
+
+    def close(self):
+        self.fd.close()
+
+
+def runBatch(tasks, output, workers=1, timeLimit=600, grace=60, threads=1,
+             memory=None, logDir=None, options=None, solve=solveInstance, fields=FIELDS):
+    '''
+    Runs solve(filename, model, timeLimit, threads, memory, options) for
+    every task (filename, model) with at most workers processes at a time.
+    A worker still running grace seconds after its time limit is killed.
+    @param solve - top-level function returning a result record, so the
+    spawned workers can import it.
+    @return - the list of result records, in the order they finished.
+    '''
+    ctx = multiprocessing.get_context("spawn")
+    options = options or {}
+    pending = list(tasks)
+    running = {}  # Process sentinel -> (process, connection, task, start time)
+    results = []
+
+    if logDir is not None:
+        os.makedirs(logDir, exist_ok=True)
+
+    writer = ResultWriter(output, fields)
+
+    def finish(task, result, started):
+        filename, model = task
+        record = {field: None for field in fields}
+        record["instance"] = os.path.splitext(os.path.basename(filename))[0]
+        record["time"] = time.time() - started
+        record.update(result)
+        record["file"] = filename
+        record["model"] = model
+
+        writer.write(record)
+        results.append(record)
+        if record.get("objective") is not None:
+            objective = "%.2f" % record["objective"]
+        elif record.get("lpBound") is not None:
+            objective = "LP %.2f" % record["lpBound"]
+        else:
+            objective = "-"
+        print("%-20s %-8s %-10s %12s %8.1fs" % (record["instance"], model, record["status"],
+                                                objective, record["time"]))
+
+    try:
+        while pending or running:
+            while pending and len(running) < workers:
+                task = filename, model = pending.pop(0)
+                logFile = None
+                if logDir is not None:
+                    logFile = os.path.join(logDir, "%s.%s.log" % (
+                        os.path.splitext(os.path.basename(filename))[0], model))
+
+                receiver, sender = ctx.Pipe(duplex=False)
+                process = ctx.Process(target=worker, daemon=True,
+                                      args=(sender, solve, filename, model, timeLimit,
+                                            threads, memory, logFile, options))
+                process.start()
+                sender.close()
+                running[process.sentinel] = (process, receiver, task, time.time())
+
+            now = time.time()
+            deadline = min(started for _, _, _, started in running.values()) \
+                + timeLimit + grace
+            ready = wait(list(running), timeout=max(0.0, deadline - now))
+
+            for sentinel in list(running):
+                process, receiver, task, started = running[sentinel]
+                if sentinel in ready:
+                    # The result is sent before the worker exits, and the exit
+                    # code is only set once it is joined:
+                    process.join()
+                    try:
+                        result = receiver.recv()
+                    except EOFError:
+                        result = {"status": "crashed",
+                                  "error": "Exit code %s" % process.exitcode}
+                elif time.time() - started > timeLimit + grace:
+                    process.kill()
+                    process.join()
+                    result = {"status": "killed",
+                              "error": "No answer %d s after the time limit" % grace}
+                else:
+                    continue
+
+                receiver.close()
+                del running[sentinel]
+                finish(task, result, started)
+    finally:
+        for process, _, _, _ in running.values():
+            process.kill()
+        writer.close()
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("instances", nargs="+",
+                        help="Instance files, directories or glob patterns.")
+    parser.add_argument("--model", choices=["mtz", "cg", "bp", "basic"], default="cg")
+    parser.add_argument("--output", default="results.jsonl",
+                        help="Result file, CSV if the name ends with .csv.")
+    parser.add_argument("--workers", type=int, default=max(1, os.cpu_count()//2))
+    parser.add_argument("--time-limit", type=float, default=600,
+                        help="SCIP time limit of each instance, in seconds.")
+    parser.add_argument("--grace", type=float, default=60,
+                        help="Seconds after the time limit before a worker is killed.")
+    parser.add_argument("--threads", type=int, default=1,
+                        help="LP and BLAS threads of each worker.")
+    parser.add_argument("--memory", type=int, default=None,
+                        help="Address space limit of each worker, in MB.")
+    parser.add_argument("--log-dir", default=None,
+                        help="Directory for the solver output of each instance.")
+    parser.add_argument("--pricing", default="labeling", choices=["labeling", "mip"])
+    parser.add_argument("--max-patterns", type=int, default=100000)
+    parser.add_argument("--neighbours", type=int, default=None,
+                        help="Size of the nearest neighbour arc set.")
+    args = parser.parse_args()
+
+    files = findInstances(args.instances)
+    if not files:
+        parser.error("no instance found")
+
+    options = {"pricing": args.pricing,
+               "maxPatterns": args.max_patterns,
+               "neighbours": args.neighbours}
+
+    print("Solving %d instances with %d workers" % (len(files), args.workers))
+    tasks = [(filename, args.model) for filename in files]
+    results = runBatch(tasks, args.output, args.workers, args.time_limit,
+                       args.grace, args.threads, args.memory, args.log_dir, options)
+
+    solved = sum(result["status"] == "optimal" for result in results)
+    print("%d of %d %s, results in %s" % (
+        solved, len(results), "LP relaxations solved" if args.model in LP_MODELS
+        else "instances solved to optimality", args.output))
+
+
+if __name__ == "__main__":
+    main()
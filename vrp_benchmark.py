@@ -0,0 +1,343 @@
+'''
+Benchmark of the VRP models against the known optimal values of the
+A-VRP set (parsed from the COMMENT line, see vrp_data.parseComment).
+
+Methods:
+    mtz   - MTZ model with capacity cuts (vrp_scip_poly)
+    cg    - LP relaxation by column generation (vrp_scip_cg)
+    cgmip - same LP relaxation, priced by the sub-MIP instead of labeling
+    int   - column generation followed by the integer re-solve over the
+            generated columns
+    bp    - branch-and-price (vrp_scip_cg)
+
+For each instance and method it records the time to the first incumbent,
+the time to reach the --gap between primal and dual bound, the final gap
+to the known optimum, the root (LP) bound and its gap to the optimum, and
+the peak RSS of the worker. Every run is done in its own process (see
+vrp_batch.runBatch). The known values use distances rounded to the
+nearest integer, which is also the default here.
+
+Results are stored in <results-dir>/<version>.jsonl (version defaults to
+the git commit), sorted by instance and method, so two versions can be
+diffed or compared with --compare.
+
+Usage:
+    python vrp_benchmark.py [--methods mtz cg int] [--time-limit 600]
+    python vrp_benchmark.py --compare benchmarks/old.jsonl benchmarks/new.jsonl
+    python vrp_benchmark.py --check-pricing data/A-VRP/A-n32-k5.vrp
+
+--check-pricing solves the LP relaxation with both pricings (cg and cgmip)
+and fails if their values differ: both are exact, so a difference means a
+pricing round ended the column generation without proving it.
+'''
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from vrp_batch import findInstances, runBatch
+
+
+# Columns of the benchmark records:
+FIELDS = ["instance", "file", "model", "status", "optimum", "objective", "bound", "gap",
+          "optimumGap", "rootBound", "rootGap", "firstIncumbent", "firstIncumbentTime", "timeToGap",
+          "time", "lpTime", "nodes", "columns", "peakRSS", "error"]
+
+
+def progressTracker(gap, start):
+    '''
+    Event handler that records when SCIP finds its first incumbent, when
+    the gap between the primal and dual bounds gets below gap, and the
+    dual bound after the root node. Times are wall-clock seconds since
+    start, so they include reading the instance and the starting
+    solution (a solution given before the solve counts as found when the
+    solve begins). The class is built on demand so that PySCIPOpt is only
+    imported by the workers.
+    '''
+    import time
+
+    from pyscipopt import Eventhdlr, SCIP_EVENTTYPE
+
+    class ProgressTracker(Eventhdlr):
+
+        firstIncumbentTime = None
+        firstIncumbent = None
+        timeToGap = None
+        rootBound = None
+
+        def eventinit(self):
+            self.update()
+            self.model.catchEvent(SCIP_EVENTTYPE.BESTSOLFOUND, self)
+            self.model.catchEvent(SCIP_EVENTTYPE.NODESOLVED, self)
+
+        def eventexit(self):
+            self.model.dropEvent(SCIP_EVENTTYPE.BESTSOLFOUND, self)
+            self.model.dropEvent(SCIP_EVENTTYPE.NODESOLVED, self)
+
+        def eventexec(self, event):
+            if event.getType() != SCIP_EVENTTYPE.BESTSOLFOUND and self.rootBound is None \
+                    and event.getNode().getDepth() == 0:
+                self.rootBound = self.model.getDualbound()
+            self.update()
+
+        def update(self):
+            '''
+            Checks the incumbent and the gap. Also called once the solve
+            ends, as the last bound change may not trigger an event.
+            '''
+            model = self.model
+            if not model.getNSols():
+                return
+
+            now = time.time() - start
+            if self.firstIncumbentTime is None:
+                self.firstIncumbentTime = now
+                self.firstIncumbent = model.getSolObjVal(model.getBestSol())
+            if self.timeToGap is None and model.getGap() <= gap:
+                self.timeToGap = now
+
+    return ProgressTracker()
+
+
+def benchmarkInstance(filename, method, timeLimit, threads, memory, options):
+    '''
+    Runs one method on one instance (in a vrp_batch worker).
+    @return - a benchmark record (see FIELDS).
+    '''
+    import resource
+    import time
+
+    from vrp_data import DataVRP
+
+    start = time.time()
+    data = DataVRP(filename)
+    if options["rounded"]:
+        data.roundDistances()
+
+    params = {"limits/time": float(timeLimit), "lp/threads": threads}
+    if memory:
+        params["limits/memory"] = 0.8*memory
+
+    tracker = progressTracker(options["gap"], start)
+
+    def includeTracker(model):
+        model.includeEventhdlr(tracker, "progress", "Benchmark progress tracker")
+
+    record = {"optimum": data.optimum}
+    if method == "mtz":
+        from vrp_scip_poly import VRPSolver
+        solver = VRPSolver(data)
+        solver.scipParams = params
+        solver.beforeOptimize = includeTracker
+        solver.solve(timeLimit)
+        scip = solver.model
+    else:
+        from vrp_scip_cg import VRPsolver
+        solver = VRPsolver(data, options["maxPatterns"],
+                           pricing="mip" if method == "cgmip" else "labeling")
+        solver.scipParams = params
+
+        if method == "bp":
+            solver.beforeOptimize = includeTracker
+            solver.solve(branchAndPrice=True)
+        elif method in ("cg", "cgmip", "int"):
+            solver.solve()
+            record["lpTime"] = time.time() - start
+            record["rootBound"] = solver.master.getObjVal()
+            if method == "int":
+                # Only what is left of the time limit, so the worker is not
+                # killed before the re-solve stops:
+                solver.scipParams = dict(params, **{
+                    "limits/time": max(1.0, timeLimit - (time.time() - start))})
+                solver.setInitialPatterns(solver.patterns)
+                solver.beforeOptimize = includeTracker
+                solver.solve(integer=True)
+        else:
+            raise ValueError("Unknown method: %s" % method)
+
+        scip = solver.master
+        record["columns"] = len(solver.patterns)
+
+    lpOnly = method in ("cg", "cgmip")
+    if not lpOnly:
+        tracker.update()
+
+    hasSolution = not lpOnly and scip.getNSols() > 0
+    record.update({"status": scip.getStatus(),
+                   "objective": scip.getPrimalbound() if hasSolution else None,
+                   "bound": scip.getDualbound(),
+                   "gap": scip.getGap() if hasSolution else None,
+                   "firstIncumbent": tracker.firstIncumbent,
+                   "firstIncumbentTime": tracker.firstIncumbentTime,
+                   "timeToGap": tracker.timeToGap,
+                   "time": time.time() - start,
+                   "nodes": scip.getNNodes(),
+                   "peakRSS": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024.0})
+
+    if record.get("rootBound") is None:
+        record["rootBound"] = tracker.rootBound
+    if record["rootBound"] is None:
+        # Stopped before the end of the root node:
+        record["rootBound"] = record["bound"]
+
+    if data.optimum:
+        if record["objective"] is not None:
+            record["optimumGap"] = (record["objective"] - data.optimum)/data.optimum
+        record["rootGap"] = (data.optimum - record["rootBound"])/data.optimum
+
+    return record
+
+
+def gitVersion():
+    '''
+    @return - the short hash of HEAD, with "-dirty" if the tree has
+    changes, or "unknown" outside a git checkout.
+    '''
+    try:
+        version = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                          stderr=subprocess.DEVNULL, text=True).strip()
+        if subprocess.call(["git", "diff", "--quiet", "HEAD"], stderr=subprocess.DEVNULL):
+            version += "-dirty"
+        return version
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def loadResults(filename):
+    with open(filename) as fd:
+        records = [json.loads(line) for line in fd if line.strip()]
+    return {(record["instance"], record["model"]): record for record in records}
+
+
+def saveResults(filename, results):
+    '''
+    Rewrites the results sorted by instance and method, so the files of
+    two versions can be diffed line by line.
+    '''
+    results = sorted(results, key=lambda record: (record["instance"], record["model"]))
+    with open(filename, "w") as fd:
+        for record in results:
+            fd.write(json.dumps({field: record.get(field) for field in FIELDS}) + "\n")
+
+
+def compareResults(baseFile, newFile, timeTolerance=0.2, gapTolerance=1e-4):
+    '''
+    Prints the time and gaps of the runs of both files side by side. A run
+    is a regression when it is more than timeTolerance slower (and at
+    least one second), its gap to the optimum or its root gap is worse by
+    more than gapTolerance, or it lost its solution.
+    @return - the number of regressions.
+    '''
+    base = loadResults(baseFile)
+    new = loadResults(newFile)
+
+    def gapText(value):
+        return "%8s" % "-" if value is None else "%7.2f%%" % (100*value)
+
+    print("%-12s %-5s %9s %9s %9s %9s %9s %9s" % ("instance", "model", "time", "new",
+                                                  "opt gap", "new", "root gap", "new"))
+    regressions = 0
+    for key in sorted(set(base) | set(new)):
+        if key not in base or key not in new:
+            print("%-12s %-5s only in %s" % (key[0], key[1],
+                                            baseFile if key in base else newFile))
+            continue
+
+        old, cur = base[key], new[key]
+        worse = []
+        if cur["time"] > old["time"]*(1 + timeTolerance) and cur["time"] - old["time"] > 1:
+            worse.append("time")
+        for field in ("optimumGap", "rootGap"):
+            if old[field] is not None and (cur[field] is None or
+                                           cur[field] > old[field] + gapTolerance):
+                worse.append(field)
+        regressions += bool(worse)
+
+        print("%-12s %-5s %9.1f %9.1f %9s %9s %9s %9s %s" % (
+            key[0], key[1], old["time"], cur["time"], gapText(old["optimumGap"]),
+            gapText(cur["optimumGap"]), gapText(old["rootGap"]), gapText(cur["rootGap"]),
+            " ".join(worse)))
+
+    print("%d regressions" % regressions)
+    return regressions
+
+
+def checkPricing(results, tolerance=1e-6):
+    '''
+    Compares the LP bounds of the cg and cgmip runs of each instance.
+    @return - the number of instances where they differ by more than
+    tolerance (relative).
+    '''
+    bounds = {}
+    for record in results:
+        bounds.setdefault(record["instance"], {})[record["model"]] = record["rootBound"]
+
+    mismatches = 0
+    for instance, bound in sorted(bounds.items()):
+        labeling, mip = bound.get("cg"), bound.get("cgmip")
+        ok = labeling is not None and mip is not None and \
+            abs(labeling - mip) <= tolerance*max(abs(labeling), 1.0)
+        mismatches += not ok
+        print("%-12s labeling %s, MIP %s %s" % (instance, labeling, mip, "" if ok else "MISMATCH"))
+
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("instances", nargs="*", default=["./data/A-VRP"])
+    parser.add_argument("--methods", nargs="+", default=["mtz", "cg", "int"],
+                        choices=["mtz", "cg", "cgmip", "int", "bp"])
+    parser.add_argument("--time-limit", type=float, default=600)
+    parser.add_argument("--grace", type=float, default=60)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Parallel runs. More than one disturbs the times.")
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--memory", type=int, default=None, help="Memory cap in MB.")
+    parser.add_argument("--gap", type=float, default=0.01,
+                        help="Gap whose time is recorded (timeToGap).")
+    parser.add_argument("--exact-distances", action="store_true",
+                        help="Do not round the distances (the known optima are "
+                             "for rounded distances).")
+    parser.add_argument("--max-patterns", type=int, default=100000)
+    parser.add_argument("--version", default=None,
+                        help="Name of the result file, the git commit by default.")
+    parser.add_argument("--results-dir", default="benchmarks")
+    parser.add_argument("--log-dir", default=None)
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"),
+                        help="Compare two result files instead of running.")
+    parser.add_argument("--check-pricing", action="store_true",
+                        help="Run cg and cgmip and fail if their LP values differ.")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compareResults(*args.compare) else 0)
+
+    files = findInstances(args.instances)
+    if not files:
+        parser.error("no instance found")
+
+    os.makedirs(args.results_dir, exist_ok=True)
+    output = os.path.join(args.results_dir, "%s.jsonl" % (args.version or gitVersion()))
+
+    options = {"rounded": not args.exact_distances,
+               "gap": args.gap,
+               "maxPatterns": args.max_patterns}
+
+    methods = ["cg", "cgmip"] if args.check_pricing else args.methods
+    tasks = [(filename, method) for filename in files for method in methods]
+    results = runBatch(tasks, output, args.workers, args.time_limit, args.grace,
+                       args.threads, args.memory, args.log_dir, options,
+                       solve=benchmarkInstance, fields=FIELDS)
+    saveResults(output, results)
+    print("Results in %s" % output)
+
+    if args.check_pricing:
+        sys.exit(1 if checkPricing(results) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+'''
+Instance data shared by the VRP models (vrp_scip.py, vrp_scip_cg.py and
+vrp_scip_poly.py).
+
+Nodes are kept in NumPy arrays indexed by row. The node ids used in the
+instance files are mapped to rows through DataVRP.index and back through
+DataVRP.ids.
+'''
+
+import hashlib
+import os
+import re
+
+import numpy as np
+
+
+# Version of the layout of the cached arrays. Bump it whenever
+# readVRPLIB changes what it returns.
+CACHE_VERSION = 1
+
+
+def readVRPLIB(filename):
+    '''
+    Streaming parser for TSPLIB/CVRPLIB files. The file is read line by
+    line; the lines of a data section are only joined and converted to
+    an array once the section ends.
+    Supports integer or float coordinates, EUC_2D and EXPLICIT edge weights
+    (FULL_MATRIX, UPPER_ROW, LOWER_ROW, UPPER_DIAG_ROW, LOWER_DIAG_ROW) and
+    any number of depots.
+    @return - a dict with the instance arrays and header values.
+    '''
+    spec = {}
+    sections = {}
+
+    section = None
+    tokens = []
+    with open(filename) as fd:
+        for line in fd:
+            line = line.strip()
+            if not line:
+                continue
+
+            if line[0].isalpha():
+                # A keyword closes the current section:
+                if section is not None:
+                    sections[section] = " ".join(tokens)
+                    section, tokens = None, []
+
+                key, sep, value = line.partition(":")
+                key = key.strip()
+                if key == "EOF":
+                    break
+                if key.endswith("_SECTION"):
+                    section = key
+                elif sep:
+                    spec[key] = value.strip()
+            elif section is not None:
+                tokens.append(line)
+
+    if section is not None:
+        sections[section] = " ".join(tokens)
+
+    size = int(spec["DIMENSION"])
+
+    def sectionArray(name, columns):
+        values = np.array(sections[name].split(), dtype=np.float64)
+        return values.reshape(-1, columns)
+
+    dist = None
+    weightType = spec.get("EDGE_WEIGHT_TYPE", "EUC_2D")
+    if weightType == "EXPLICIT":
+        dist = explicitWeights(np.array(sections["EDGE_WEIGHT_SECTION"].split(),
+                                        dtype=np.float64),
+                               spec.get("EDGE_WEIGHT_FORMAT", "FULL_MATRIX"), size)
+    elif weightType != "EUC_2D":
+        raise ValueError("Unsupported EDGE_WEIGHT_TYPE: %s" % weightType)
+
+    coordSection = "NODE_COORD_SECTION"
+    if coordSection not in sections:
+        coordSection = "DISPLAY_DATA_SECTION"
+
+    if coordSection in sections:
+        coords = sectionArray(coordSection, 3)
+        ids = coords[:, 0].astype(np.int64)
+        coords = np.ascontiguousarray(coords[:, 1:])
+    else:
+        # Explicit instance without display data:
+        ids = np.arange(1, size + 1)
+        coords = np.zeros((size, 2))
+
+    demand = np.zeros(size, dtype=np.int64)
+    if "DEMAND_SECTION" in sections:
+        demands = sectionArray("DEMAND_SECTION", 2).astype(np.int64)
+        rows = np.searchsorted(ids, demands[:, 0]) if np.all(ids[:-1] < ids[1:]) \
+            else np.array([np.nonzero(ids == n)[0][0] for n in demands[:, 0]])
+        demand[rows] = demands[:, 1]
+
+    depots = np.array(sections.get("DEPOT_SECTION", "").split(), dtype=np.int64)
+    depots = depots[depots >= 0]
+    if len(depots) == 0:
+        depots = ids[:1]
+
+    return {"name": spec.get("NAME", ""),
+            "comment": spec.get("COMMENT", ""),
+            "cap": int(float(spec.get("CAPACITY", 0))),
+            "ids": ids,
+            "coords": coords,
+            "demand": demand,
+            "depots": depots,
+            "dist": dist}
+
+
+def parseComment(comment):
+    '''
+    Reads the values given in the COMMENT line of the Augerat instances,
+    e.g. "(Augerat et al, Min no of trucks: 5, Optimal value: 784)".
+    @return - (value, proven, trucks): the optimal or best known value,
+    whether it is optimal and the minimum number of trucks. None for the
+    values that are not found.
+    '''
+    value = proven = trucks = None
+
+    match = re.search(r"(Optimal|Best) value:\s*([0-9.]+)", comment or "")
+    if match:
+        value = float(match.group(2))
+        proven = match.group(1) == "Optimal"
+
+    match = re.search(r"no of trucks:\s*([0-9]+)", comment or "")
+    if match:
+        trucks = int(match.group(1))
+
+    return value, proven, trucks
+
+
+def explicitWeights(values, weightFormat, size):
+    '''
+    Builds the full distance matrix of an EXPLICIT EDGE_WEIGHT_SECTION.
+    '''
+    if weightFormat == "FULL_MATRIX":
+        return values.reshape(size, size)
+
+    dist = np.zeros((size, size))
+    if weightFormat == "UPPER_ROW":
+        rows, cols = np.triu_indices(size, 1)
+    elif weightFormat == "LOWER_ROW":
+        rows, cols = np.tril_indices(size, -1)
+    elif weightFormat == "UPPER_DIAG_ROW":
+        rows, cols = np.triu_indices(size)
+    elif weightFormat == "LOWER_DIAG_ROW":
+        rows, cols = np.tril_indices(size)
+    else:
+        raise ValueError("Unsupported EDGE_WEIGHT_FORMAT: %s" % weightFormat)
+
+    dist[rows, cols] = values
+    dist[cols, rows] = values
+    return dist
+
+
+def fileHash(filename):
+    sha = hashlib.sha1()
+    with open(filename, "rb") as fd:
+        for chunk in iter(lambda: fd.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def readVRPLIBCached(filename, cacheDir=None):
+    '''
+    Same as readVRPLIB, but the result is stored in a .npz file named
+    after the SHA-1 of the instance file. By default the cache lives in a
+    .vrpcache directory next to the instance.
+    '''
+    if cacheDir is None:
+        cacheDir = os.path.join(os.path.dirname(os.path.abspath(filename)), ".vrpcache")
+
+    cacheFile = os.path.join(cacheDir, "%s-v%d.npz" % (fileHash(filename), CACHE_VERSION))
+
+    if os.path.exists(cacheFile):
+        with np.load(cacheFile, allow_pickle=False) as cached:
+            instance = {key: cached[key] for key in cached.files}
+        instance["name"] = str(instance["name"])
+        instance["comment"] = str(instance["comment"])
+        instance["cap"] = int(instance["cap"])
+        instance["dist"] = instance["dist"] if instance["dist"].size else None
+        return instance
+
+    instance = readVRPLIB(filename)
+
+    try:
+        os.makedirs(cacheDir, exist_ok=True)
+        arrays = dict(instance)
+        if arrays["dist"] is None:
+            # Euclidean distances are cheaper to recompute than to load:
+            arrays["dist"] = np.zeros((0, 0))
+
+        tmpFile = "%s.%d.tmp.npz" % (cacheFile[:-4], os.getpid())
+        np.savez(tmpFile, **arrays)
+        os.replace(tmpFile, cacheFile)
+    except OSError:
+        # A read-only data directory only means no cache:
+        pass
+
+    return instance
+
+
+class CostMatrixView:
+    '''
+    Thin read-only view over the dense distance matrix. It allows the
+    existing ``costs[i, j]`` lookups (keyed by node ids) to keep working
+    without materializing a dict of n^2 entries.
+    '''
+
+    def __init__(self, dist, index):
+        self.dist = dist
+        self.index = index
+
+    def __getitem__(self, key):
+        i, j = key
+        return float(self.dist[self.index[i], self.index[j]])
+
+    def __contains__(self, key):
+        i, j = key
+        return i in self.index and j in self.index
+
+    def __len__(self):
+        return self.dist.size
+
+
+class DataVRP:
+    cap = None  # Capacity of the truck
+    depot = None  # We are assuming one depot
+    depots = None  # All the depots listed in the file
+
+    # Array representation (one row per node):
+    ids = None  # Node id of each row
+    index = None  # Row of each node id
+    coords = None  # (n, 2) float64 coordinates
+    demand = None  # (n,) demands, zero for the depot
+    dist = None  # (n, n) float64 distance matrix
+    depotIndex = None  # Row of the depot
+    euclidean = False  # Whether dist was computed from coords
+
+    # Values from the COMMENT line, see parseComment:
+    optimum = None  # Optimal or best known value
+    optimumProven = None  # Whether optimum is proven optimal
+    minTrucks = None
+
+    def __init__(self, filename, cacheDir=None, useCache=True):
+        '''
+        Reads a TSPLIB/CVRPLIB instance. When useCache is True the parsed
+        arrays are stored in a binary sidecar (see readVRPLIBCached) so the
+        next run over the same file skips parsing.
+        '''
+        if useCache:
+            instance = readVRPLIBCached(filename, cacheDir)
+        else:
+            instance = readVRPLIB(filename)
+
+        self.name = instance["name"]
+        self.comment = instance["comment"]
+        self.optimum, self.optimumProven, self.minTrucks = parseComment(self.comment)
+        self.depots = [int(d) for d in instance["depots"]]
+
+        # The models only handle one depot, the others are kept in self.depots:
+        depot = self.depots[0]
+
+        ids = instance["ids"]
+        self.nodes = {int(n): (x, y) for n, (x, y) in zip(ids, instance["coords"].tolist())}
+        self.demands = {int(n): d for n, d in zip(ids, instance["demand"].tolist())}
+
+        self.setArrays(ids, instance["coords"], instance["demand"],
+                       int(instance["cap"]), depot, instance["dist"])
+
+    @classmethod
+    def fromArrays(cls, coords, demand, cap, depotIndex=0, ids=None):
+        '''
+        Builds an instance directly from arrays (e.g. synthetic instances).
+        Node ids default to 1..n as in the TSPLIB files.
+        '''
+        data = cls.__new__(cls)
+        coords = np.asarray(coords, dtype=np.float64)
+        if ids is None:
+            ids = np.arange(1, len(coords) + 1)
+        ids = np.asarray(ids)
+
+        data.name = data.comment = None
+        data.depots = [int(ids[depotIndex])]
+        data.nodes = {int(n): (x, y) for n, (x, y) in zip(ids, coords.tolist())}
+        data.demands = {int(n): d for n, d in zip(ids, np.asarray(demand).tolist())}
+        data.setArrays(ids, coords, np.asarray(demand), cap, int(ids[depotIndex]))
+
+        return data
+
+    def setArrays(self, ids, coords, demand, cap, depot, dist=None):
+        self.ids = ids
+        self.index = {int(n): r for r, n in enumerate(ids.tolist())}
+        self.coords = coords
+        self.demand = demand
+        self.cap = cap
+        self.depot = depot
+        self.depotIndex = self.index[depot]
+
+        self.euclidean = dist is None
+        if dist is None:
+            self.computeCostMatrix()
+        else:
+            # EXPLICIT edge weights:
+            self.dist = dist
+            self.costs = CostMatrixView(dist, self.index)
+
+    def computeCostMatrix(self):
+        '''
+        Euclidean distances between every pair of nodes in one broadcast.
+        The matrix is built in place to keep the peak memory at two n x n
+        buffers.
+        '''
+        x = self.coords[:, 0]
+        y = self.coords[:, 1]
+
+        dist = np.subtract.outer(x, x)
+        dy = np.subtract.outer(y, y)
+        np.hypot(dist, dy, out=dist)
+        del dy
+
+        self.dist = dist
+        self.costs = CostMatrixView(dist, self.index)
+
+    def roundDistances(self):
+        '''
+        Rounds the distances to the nearest integer as in TSPLIB (nint),
+        the convention of the known optimal values. The matrix is changed
+        in place, so it must be called before building any model.
+        '''
+        np.floor(self.dist + 0.5, out=self.dist)
+
+    def nearestNeighbourArcs(self, k):
+        '''
+        Sparse arc set: the arcs between each node and its k nearest
+        neighbours, in both directions, plus every arc leaving or entering
+        the depot. Euclidean instances use a k-d tree when SciPy is
+        available, otherwise each row of the cost matrix is partitioned.
+        @return - (m, 2) array with the arcs (i, j) as rows of the data arrays.
+        '''
+        n = len(self.ids)
+        k = min(k, n - 1)
+
+        try:
+            # Imported here, as SciPy takes longer to import than the solvers:
+            from scipy.spatial import cKDTree
+        except ImportError:
+            cKDTree = None
+
+        if self.euclidean and cKDTree is not None:
+            # The first neighbour of each node is the node itself:
+            _, nearest = cKDTree(self.coords).query(self.coords, k + 1)
+            nearest = nearest[:, 1:]
+        else:
+            # Rows of the cost matrix partitioned a block at a time, so only
+            # a block is copied:
+            nearest = np.empty((n, k), dtype=np.int64)
+            block = max(1, (1 << 22)//n)
+            for start in range(0, n, block):
+                stop = min(n, start + block)
+                dist = self.dist[start:stop].copy()
+                dist[np.arange(stop - start), np.arange(start, stop)] = np.inf
+                nearest[start:stop] = np.argpartition(dist, k - 1, axis=1)[:, :k]
+
+        # O(n*k) pairs: to the neighbours, from them, and to and from the depot:
+        nodes = np.arange(n)
+        depot = np.full(n, self.depotIndex)
+        rows = np.repeat(nodes, k)
+        arcs = np.concatenate([np.column_stack([rows, nearest.ravel()]),
+                               np.column_stack([nearest.ravel(), rows]),
+                               np.column_stack([depot, nodes]),
+                               np.column_stack([nodes, depot])])
+        arcs = np.unique(arcs, axis=0)
+
+        return arcs[arcs[:, 0] != arcs[:, 1]]
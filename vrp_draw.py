@@ -0,0 +1,39 @@
+'''
+Drawing of the VRP solutions. networkx and matplotlib are only imported
+when a solution is drawn, so the solver modules can be imported (e.g. by
+the batch workers) with just pyscipopt and numpy.
+'''
+
+
+def drawEdges(edges, positions, filename=None):
+    '''
+    Draws the directed edges (i, j) over the node positions.
+    @param positions - dict node -> (x, y), e.g. DataVRP.nodes.
+    @param filename - if given, the drawing is saved to this file (the
+    format follows the extension) with the non-interactive Agg canvas,
+    which needs no display. Otherwise it is shown with pyplot.
+    '''
+    import networkx as nx
+
+    graph = nx.DiGraph()
+    graph.add_edges_from(edges)
+
+    if filename is None:
+        import matplotlib.pyplot as plt
+        ax = plt.gca()
+    else:
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        figure = Figure()
+        FigureCanvasAgg(figure)
+        ax = figure.add_subplot()
+
+    nx.draw_networkx_nodes(graph, positions, ax=ax)
+    nx.draw_networkx_edges(graph, positions, ax=ax)
+    nx.draw_networkx_labels(graph, positions, ax=ax)
+
+    if filename is None:
+        plt.show()
+    else:
+        figure.savefig(filename)
@@ -0,0 +1,288 @@
+'''
+Route heuristics for the VRP models. Routes are lists of rows of the
+DataVRP arrays starting and ending at the depot: [depot, r1, ..., rk, depot].
+
+The pricing heuristics work on the dual-adjusted problem: the reduced cost
+of a route is its length minus the duals of the clients it visits.
+'''
+
+import numpy as np
+
+
+def routeLength(route, dist):
+    route = np.asarray(route)
+    return float(dist[route[:-1], route[1:]].sum())
+
+
+def routeReducedCost(route, dist, duals):
+    return routeLength(route, dist) - float(duals[route[1:-1]].sum())
+
+
+def nearestNeighbourRoutes(redCost, demand, cap, depot, eps=1e-6):
+    '''
+    Greedy pricing: starting from each client, repeatedly moves to the
+    client with the cheapest reduced-cost arc that still fits in the
+    vehicle. Every prefix closed back at the depot is a candidate route.
+    @param redCost - (n, n) arc reduced costs, np.inf for forbidden arcs.
+    @return - a list of (reducedCost, route) with negative reduced cost.
+    '''
+    n = len(demand)
+    routes = {}
+
+    for start in range(n):
+        if start == depot or demand[start] > cap or redCost[depot, start] == np.inf:
+            continue
+
+        free = np.ones(n, dtype=bool)
+        free[depot] = free[start] = False
+        route = [depot, start]
+        cost = redCost[depot, start]
+        load = demand[start]
+
+        while True:
+            closed = cost + redCost[route[-1], depot]
+            if closed < -eps:
+                routes[tuple(route + [depot])] = closed
+
+            candidates = redCost[route[-1]] + np.where(free & (demand + load <= cap), 0, np.inf)
+            nxt = int(np.argmin(candidates))
+            if candidates[nxt] == np.inf:
+                break
+
+            cost += candidates[nxt]
+            load += demand[nxt]
+            free[nxt] = False
+            route.append(nxt)
+
+    return sorted((cost, list(route)) for route, cost in routes.items())
+
+
+def twoOpt(route, dist):
+    '''
+    Best-improvement 2-opt inside one route. All the candidate moves are
+    evaluated at once with NumPy.
+    '''
+    route = list(route)
+    while len(route) > 4:
+        r = np.asarray(route)
+        a, b = r[:-1], r[1:]
+        current = dist[a, b]
+
+        # Replacing edges (a_i, b_i) and (a_k, b_k) by (a_i, a_k) and (b_i, b_k):
+        delta = dist[a[:, None], a[None, :]] + dist[b[:, None], b[None, :]] \
+            - current[:, None] - current[None, :]
+        delta[np.tril_indices(len(a), 1)] = 0.0
+
+        i, k = np.unravel_index(np.argmin(delta), delta.shape)
+        if delta[i, k] >= -1e-9:
+            break
+        route[i + 1:k + 1] = route[i + 1:k + 1][::-1]
+
+    return route
+
+
+def improveRoute(route, dist, duals, demand, cap, maxMoves=100):
+    '''
+    Local search on the reduced cost of one route. Moves: 2-opt,
+    relocation of a client inside the route, insertion of a client that is
+    not visited and removal of a visited client. Best improvement.
+    @param duals - (n,) duals of the clients (zero for the depot).
+    '''
+    route = twoOpt(route, dist)
+    n = len(demand)
+
+    for _ in range(maxMoves):
+        r = np.asarray(route)
+        prev, nxt = r[:-1], r[1:]
+        load = demand[r].sum()
+
+        # Insertion of a client c between prev[p] and nxt[p]:
+        inRoute = np.zeros(n, dtype=bool)
+        inRoute[r] = True
+        outside = np.nonzero(~inRoute & (demand + load <= cap))[0]
+        insert = dist[prev[:, None], outside[None, :]] + dist[outside[None, :], nxt[:, None]] \
+            - dist[prev, nxt][:, None] - duals[outside][None, :]
+
+        # Removal of the client at position p (1..k):
+        clients = r[1:-1]
+        remove = dist[r[:-2], r[2:]] - dist[r[:-2], clients] - dist[clients, r[2:]] \
+            + duals[clients]
+
+        # Relocation of a client inside the route:
+        relocate = remove[:, None] + dist[prev[None, :], clients[:, None]] \
+            + dist[clients[:, None], nxt[None, :]] - dist[prev, nxt][None, :] \
+            - duals[clients][:, None]
+        for p in range(len(clients)):
+            # Edges adjacent to the client itself are not valid targets:
+            relocate[p, p:p + 2] = np.inf
+
+        best = [np.inf, np.inf, np.inf]
+        if insert.size:
+            best[0] = insert.min()
+        if len(clients) > 1:
+            best[1] = remove.min()
+            best[2] = relocate.min()
+
+        move = int(np.argmin(best))
+        if best[move] >= -1e-9:
+            break
+
+        if move == 0:
+            p, c = np.unravel_index(np.argmin(insert), insert.shape)
+            route.insert(p + 1, int(outside[c]))
+        elif move == 1:
+            del route[int(np.argmin(remove)) + 1]
+        else:
+            p, q = np.unravel_index(np.argmin(relocate), relocate.shape)
+            client = route[p + 1]
+            # Position q refers to the edge (route[q], route[q + 1]) before removal:
+            route.insert(q + 1, client)
+            del route[p + 1 if q > p else p + 2]
+
+        route = twoOpt(route, dist)
+
+    return route
+
+
+def clarkeWright(dist, demand, cap, depot):
+    '''
+    Parallel Clarke-Wright savings. Every client starts in its own route
+    and the savings s_ij = d_0i + d_0j - d_ij are scanned in decreasing
+    order, merging the two routes that have i and j at their ends when
+    the merged load fits in the vehicle.
+    @return - a list of routes [depot, r1, ..., rk, depot].
+    '''
+    n = len(demand)
+    clients = np.array([i for i in range(n) if i != depot])
+
+    i, j = np.triu_indices(len(clients), 1)
+    i, j = clients[i], clients[j]
+    savings = dist[depot, i] + dist[depot, j] - dist[i, j]
+    order = np.argsort(-savings, kind="stable")
+
+    routes = {int(c): [int(c)] for c in clients}  # Route id -> clients in order
+    routeOf = {int(c): int(c) for c in clients}
+    load = {int(c): int(demand[c]) for c in clients}
+
+    for k in order.tolist():
+        if savings[k] <= 0:
+            break
+        a, b = int(i[k]), int(j[k])
+        ra, rb = routeOf[a], routeOf[b]
+        if ra == rb or load[ra] + load[rb] > cap:
+            continue
+
+        first, second = routes[ra], routes[rb]
+        # a must be an end of its route and b an end of the other one:
+        if first[-1] != a:
+            if first[0] != a:
+                continue
+            first.reverse()
+        if second[0] != b:
+            if second[-1] != b:
+                continue
+            second.reverse()
+
+        first.extend(second)
+        load[ra] += load.pop(rb)
+        del routes[rb]
+        for c in second:
+            routeOf[c] = ra
+
+    return [[depot] + route + [depot] for route in routes.values()]
+
+
+def relocateMoves(first, second, dist, demand, cap):
+    '''
+    Best relocation of a client of route first into route second.
+    @return - (delta, p, q): moving the client at position p of first to
+    the edge q of second (between second[q] and second[q + 1]).
+    '''
+    a = np.asarray(first)
+    b = np.asarray(second)
+    clients = a[1:-1]
+    if len(clients) == 0:
+        return np.inf, None, None
+
+    remove = dist[a[:-2], a[2:]] - dist[a[:-2], clients] - dist[clients, a[2:]]
+    insert = dist[b[:-1][None, :], clients[:, None]] + dist[clients[:, None], b[1:][None, :]] \
+        - dist[b[:-1], b[1:]][None, :]
+    delta = remove[:, None] + insert
+    delta[demand[clients] + demand[b].sum() > cap, :] = np.inf
+
+    p, q = np.unravel_index(np.argmin(delta), delta.shape)
+    return delta[p, q], int(p) + 1, int(q)
+
+
+def swapMoves(first, second, dist, demand, cap):
+    '''
+    Best exchange of a client of route first with a client of route second.
+    @return - (delta, p, q) with the positions of the exchanged clients.
+    '''
+    a = np.asarray(first)
+    b = np.asarray(second)
+    ca, cb = a[1:-1], b[1:-1]
+    if len(ca) == 0 or len(cb) == 0:
+        return np.inf, None, None
+
+    pa, na = a[:-2], a[2:]
+    pb, nb = b[:-2], b[2:]
+
+    # Client cb[q] takes the place of ca[p] and vice versa:
+    deltaA = dist[pa[:, None], cb[None, :]] + dist[cb[None, :], na[:, None]] \
+        - (dist[pa, ca] + dist[ca, na])[:, None]
+    deltaB = dist[pb[None, :], ca[:, None]] + dist[ca[:, None], nb[None, :]] \
+        - (dist[pb, cb] + dist[cb, nb])[None, :]
+    delta = deltaA + deltaB
+
+    change = demand[cb][None, :] - demand[ca][:, None]
+    delta[(demand[a].sum() + change > cap) | (demand[b].sum() - change > cap)] = np.inf
+
+    p, q = np.unravel_index(np.argmin(delta), delta.shape)
+    return delta[p, q], int(p) + 1, int(q) + 1
+
+
+def improveSolution(routes, dist, demand, cap, maxMoves=1000):
+    '''
+    Local search on a full solution: best-improvement relocation and swap
+    of clients between routes, followed by 2-opt on the changed routes.
+    Routes left without clients are removed.
+    '''
+    routes = [twoOpt(route, dist) for route in routes]
+
+    for _ in range(maxMoves):
+        best = (-1e-9, None)
+        for r, first in enumerate(routes):
+            for s, second in enumerate(routes):
+                if r == s:
+                    continue
+                delta, p, q = relocateMoves(first, second, dist, demand, cap)
+                if delta < best[0]:
+                    best = (delta, ("relocate", r, s, p, q))
+                if r < s:
+                    delta, p, q = swapMoves(first, second, dist, demand, cap)
+                    if delta < best[0]:
+                        best = (delta, ("swap", r, s, p, q))
+
+        if best[1] is None:
+            break
+
+        move, r, s, p, q = best[1]
+        first, second = routes[r], routes[s]
+        if move == "relocate":
+            second.insert(q + 1, first.pop(p))
+        else:
+            first[p], second[q] = second[q], first[p]
+
+        routes[r] = twoOpt(first, dist)
+        routes[s] = twoOpt(second, dist)
+        routes = [route for route in routes if len(route) > 2]
+
+    return routes
+
+
+def savingsSolution(dist, demand, cap, depot):
+    '''
+    Clarke-Wright savings followed by improveSolution.
+    '''
+    return improveSolution(clarkeWright(dist, demand, cap, depot), dist, demand, cap)
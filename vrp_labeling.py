@@ -0,0 +1,320 @@
+'''
+Labeling algorithm for the pricing problem of the VRP column generation
+(elementary shortest path problem with resource constraints, ESPPRC).
+
+Routes start and end at the depot and the capacity is the only resource.
+The search is bidirectional: forward labels leave the depot, backward
+labels arrive at it, and each direction is only extended while its load is
+at most half of the capacity. The two halves are joined at the end.
+
+Cycles are handled by ng-route relaxation: a label only remembers the
+visited nodes that are in the neighbourhood of its current node. With
+cycleElimination="2cycle" it remembers only the last two nodes, and with
+"elementary" it remembers every node (exact ESPPRC). Only elementary
+routes are returned; in the relaxed modes they are not necessarily the
+most negative ones. If the ng relaxation finds a negative route but no
+elementary one, the nodes repeated by the best cycling route are added to
+every neighbourhood and the search is repeated (decremental state space
+relaxation). Other modes fall back to the elementary search directly, so
+a negative route is always found when one exists.
+
+Branching may require some edges {i, j}: a route that visits client i
+must then have j as its predecessor or successor. A label remembers the
+neighbour it still needs in Label.need.
+'''
+
+import heapq
+from collections import deque
+
+import numpy as np
+
+
+class Label:
+    __slots__ = ("cost", "load", "node", "mask", "visited", "elementary",
+                 "parent", "alive", "need")
+
+    def __init__(self, cost, load, node, mask, visited, elementary, parent, need=-1):
+        self.cost = cost  # Reduced cost of the partial path
+        self.load = load  # Demand served so far
+        self.node = node  # Last node of the partial path
+        self.mask = mask  # ng-memory as a bitset over rows
+        self.visited = visited  # Every visited row as a bitset
+        self.elementary = elementary  # Whether the path has no cycles
+        self.parent = parent
+        self.alive = True
+        self.need = need  # Required next node, -1 if any
+
+    def path(self):
+        nodes = []
+        label = self
+        while label is not None:
+            nodes.append(label.node)
+            label = label.parent
+        return nodes
+
+
+class LabelingPricer:
+
+    # Tolerance to consider a reduced cost negative:
+    eps = 1e-6
+
+    # Maximum number of routes returned by solve:
+    maxRoutes = 1
+
+    # Nodes repeated by the best non-elementary route of the last join:
+    repeated = 0
+
+    # Required neighbours of each node (see solve):
+    required = None
+
+    def __init__(self, dist, demand, cap, depot, ngSize=8, cycleElimination="ng",
+                 maxRoutes=1):
+        '''
+        @param dist - (n, n) distance matrix, used to build the ng neighbourhoods.
+        @param demand - (n,) demands of the rows.
+        @param cap - capacity of the vehicle.
+        @param depot - row of the depot.
+        @param ngSize - size of the ng neighbourhood of each client.
+        @param cycleElimination - "ng", "2cycle" or "elementary".
+        @param maxRoutes - maximum number of routes returned by solve.
+        '''
+        self.maxRoutes = maxRoutes
+        self.n = len(demand)
+        self.demand = [int(d) for d in demand]
+        self.cap = cap
+        self.depot = depot
+        self.clients = [i for i in range(self.n) if i != depot]
+        self.bit = [1 << i for i in range(self.n)]
+        self.cycleElimination = cycleElimination
+
+        allClients = sum(self.bit[i] for i in self.clients)
+        if cycleElimination == "ng":
+            clients = np.array(self.clients)
+            self.ng = [0]*self.n
+            for i in self.clients:
+                nearest = clients[np.argsort(dist[i, clients], kind="stable")[:ngSize]]
+                self.ng[i] = self.bit[i] | sum(self.bit[j] for j in nearest.tolist())
+        elif cycleElimination in ("2cycle", "elementary"):
+            self.ng = [allClients]*self.n
+        else:
+            raise ValueError("Unknown cycle elimination: %s" % cycleElimination)
+
+        self.allClients = [allClients]*self.n
+
+    def solve(self, redCost, requiredEdges=()):
+        '''
+        @param redCost - (n, n) array with the reduced cost of each arc. Arcs
+        that cannot be used must be set to np.inf.
+        @param requiredEdges - edges (i, j) that must be used by any route
+        visiting client i or client j.
+        @return - (routes, lowerBound) in which routes is a list of
+        (reducedCost, [depot, r1, ..., rk, depot]) sorted by reduced cost with
+        the (at most maxRoutes) best elementary routes of negative reduced
+        cost that were found, and
+        lowerBound is min(0, minimum reduced cost of any route).
+        '''
+        self.required = [frozenset() for _ in range(self.n)]
+        for i, j in requiredEdges:
+            if i != self.depot:
+                self.required[i] |= {j}
+            if j != self.depot:
+                self.required[j] |= {i}
+
+        routes, lowerBound = self.labelSetting(redCost, self.ng,
+                                               self.cycleElimination == "2cycle")
+
+        ng = self.ng
+        while not routes and lowerBound < -self.eps and self.cycleElimination == "ng" \
+                and self.repeated:
+            # Nodes in the memory of every label cannot be repeated:
+            ng = [mask | self.repeated for mask in ng]
+            routes, lowerBound = self.labelSetting(redCost, ng, False)
+
+        if not routes and lowerBound < -self.eps and self.cycleElimination != "elementary":
+            # The relaxation found cycles only, so it is not conclusive:
+            routes, lowerBound = self.labelSetting(redCost, self.allClients, False)
+
+        return routes, lowerBound
+
+    def labelSetting(self, redCost, ng, twoCycle):
+        arcs = redCost.tolist()
+        forward = self.extend(arcs, ng, twoCycle)
+        backward = self.extend(redCost.T.tolist(), ng, twoCycle)
+
+        return self.join(arcs, forward, backward)
+
+    def extend(self, arcs, ng, twoCycle):
+        '''
+        Mono-directional label setting. Labels are extended while their load
+        is at most half of the capacity.
+        @return - a list with the non-dominated labels of each node.
+        '''
+        cap, demand, bit, depot = self.cap, self.demand, self.bit, self.depot
+        required = self.required
+        half = cap/2.0
+        inf = np.inf
+
+        labels = [[] for _ in range(self.n)]
+        start = Label(0.0, 0, depot, 0, 0, True, None)
+        labels[depot].append(start)
+
+        queue = deque([start])
+        while queue:
+            label = queue.popleft()
+            if not label.alive or label.load > half:
+                continue
+
+            i = label.node
+            row = arcs[i]
+            for j in self.clients:
+                if label.mask & bit[j]:
+                    continue
+                load = label.load + demand[j]
+                if load > cap or row[j] == inf:
+                    continue
+                if label.need >= 0 and label.need != j:
+                    continue
+
+                need = -1
+                if required[j]:
+                    missing = required[j] - {i}
+                    if len(missing) > 1:
+                        continue
+                    if missing:
+                        need, = missing
+
+                cost = label.cost + row[j]
+                if twoCycle:
+                    mask = bit[j] | (bit[i] if i != depot else 0)
+                else:
+                    mask = (label.mask & ng[j]) | bit[j]
+
+                bucket = labels[j]
+                dominated = False
+                for other in bucket:
+                    if other.cost <= cost and other.load <= load and other.mask | mask == mask \
+                            and (other.need < 0 or other.need == need):
+                        dominated = True
+                        break
+                if dominated:
+                    continue
+
+                keep = []
+                for other in bucket:
+                    if cost <= other.cost and load <= other.load and mask | other.mask == other.mask \
+                            and (need < 0 or need == other.need):
+                        other.alive = False
+                    else:
+                        keep.append(other)
+
+                new = Label(cost, load, j, mask, label.visited | bit[j],
+                            label.elementary and not label.visited & bit[j], label, need)
+                keep.append(new)
+                labels[j] = keep
+                queue.append(new)
+
+        return labels
+
+    def join(self, arcs, forward, backward):
+        '''
+        Joins forward labels at i with backward labels at j through the arc
+        (i, j). Keeps the maxRoutes best elementary routes.
+        '''
+        cap, eps, inf = self.cap, self.eps, np.inf
+
+        for j in self.clients:
+            backward[j].sort(key=lambda label: label.cost)
+
+        routes = {}
+        best = []  # Heap with the kept routes, the worst one on top
+        threshold = -eps
+        lowerBound = 0.0
+        cycle, cycleCost = None, 0.0  # Best join that is not elementary
+        for i in range(self.n):
+            row = arcs[i]
+            for f in forward[i]:
+                for j in self.clients:
+                    if i == j or row[j] == inf or (f.need >= 0 and f.need != j):
+                        continue
+                    prefix = f.cost + row[j]
+                    first = True
+                    for b in backward[j]:
+                        total = prefix + b.cost
+                        if total >= -eps or (total >= threshold and not first):
+                            break
+                        if f.load + b.load > cap or f.mask & b.mask:
+                            continue
+                        if b.need >= 0 and b.need != i:
+                            continue
+
+                        if first:
+                            # Labels are sorted, so this is the best join of (f, j):
+                            lowerBound = min(lowerBound, total)
+                            first = False
+
+                        if total >= threshold:
+                            break
+
+                        if f.elementary and b.elementary and not f.visited & b.visited:
+                            route = tuple(f.path()[::-1] + b.path())
+                            if route in routes:
+                                continue
+                            routes[route] = total
+                            heapq.heappush(best, (-total, route))
+                            if len(best) > self.maxRoutes:
+                                _, worst = heapq.heappop(best)
+                                del routes[worst]
+                            if len(best) == self.maxRoutes:
+                                threshold = -best[0][0]
+                        elif total < cycleCost:
+                            cycle, cycleCost = (f, b), total
+
+        # Bitset with the nodes repeated by the best cycling route:
+        self.repeated = 0
+        if cycle is not None:
+            seen = 0
+            for node in cycle[0].path() + cycle[1].path():
+                if node != self.depot and seen & self.bit[node]:
+                    self.repeated |= self.bit[node]
+                seen |= self.bit[node]
+
+        routes = sorted((cost, list(route)) for route, cost in routes.items())
+        return routes, lowerBound
+
+
+def qRouteArcBounds(redCost, demand, cap, depot):
+    '''
+    Lower bound on the reduced cost of any route through each arc, from
+    q-routes (walks from the depot that may repeat clients) computed by
+    dynamic programming over the load:
+    F[q, i] is the cheapest walk depot -> i with load q and B[q, j] the
+    cheapest walk j -> depot with load q. The bound of (i, j) is
+    min over q of F[q, i] + redCost[i, j] + min(B[q', j] : q' <= cap - q).
+    Demands must be positive integers.
+    @return - (n, n) array, np.inf for arcs in no route.
+    '''
+    n = len(demand)
+    demand = np.asarray(demand, dtype=np.int64)
+    clients = np.array([i for i in range(n) if i != depot])
+
+    def walks(arcs):
+        # walks(redCost) is F, walks(redCost.T) is B:
+        best = np.full((cap + 1, n), np.inf)
+        best[0, depot] = 0.0
+        for q in range(1, cap + 1):
+            fits = clients[demand[clients] <= q]
+            if len(fits):
+                previous = best[q - demand[fits]]  # (len(fits), n)
+                best[q, fits] = (previous + arcs[:, fits].T).min(axis=1)
+        return best
+
+    forward = walks(redCost)
+    backward = np.minimum.accumulate(walks(redCost.T), axis=0)
+
+    bounds = np.full((n, n), np.inf)
+    for q in range(cap + 1):
+        reachable = forward[q] < np.inf
+        if reachable.any():
+            np.minimum(bounds, forward[q][:, None] + backward[cap - q][None, :], out=bounds)
+
+    return bounds + redCost
@@ -0,0 +1,147 @@
+'''
+Instrumentation of the column generation of vrp_scip_cg.py.
+
+When VRPsolver.monitor (or VRPpricer.monitor) is set, the pricer builds
+one record per pricing round and hands it to the callbacks of the
+PricingMonitor. A record is a dict with:
+
+    round         - pricing round (1, 2, ...)
+    node          - number of the branch-and-bound node
+    farkas        - whether it was a Farkas pricing round (infeasible LP)
+    masterTime    - seconds since the previous round ended, i.e. the master
+                    LP re-solve (and branching, when a node changes)
+    buildTime     - seconds spent building the pricing problem (reduced
+                    cost matrix, updates of the sub-MIP)
+    solveTime     - rest of the pricing time
+    tier          - last pricing tier run (greedy, localSearch, exact)
+    minRedCost    - most negative reduced cost found, None if no column
+    lowerBound    - reduced-cost lower bound of the exact tier, if it ran
+    columnsAdded  - columns added to the master in the round
+    columns       - columns in the master after the round
+    lpObj         - objective of the master LP, None in Farkas rounds
+    lagrangianBound
+    eliminatedArcs
+
+Without a monitor no record is built.
+'''
+
+import json
+
+
+class PricingMonitor:
+    '''
+    Keeps the records of the rounds (if keep is True) and passes each one
+    to the callbacks, e.g. a JSONLSink or a MetricsRegistry.
+    '''
+
+    def __init__(self, *callbacks, keep=True):
+        self.callbacks = list(callbacks)
+        self.rounds = [] if keep else None
+
+    def addCallback(self, callback):
+        self.callbacks.append(callback)
+
+    def record(self, record):
+        if self.rounds is not None:
+            self.rounds.append(record)
+        for callback in self.callbacks:
+            callback(record)
+
+    def summary(self):
+        '''
+        @return - total master, build and solve times and the number of
+        rounds and added columns of the kept records.
+        '''
+        rounds = self.rounds or []
+        return {"rounds": len(rounds),
+                "columnsAdded": sum(r["columnsAdded"] for r in rounds),
+                "masterTime": sum(r["masterTime"] for r in rounds),
+                "buildTime": sum(r["buildTime"] for r in rounds),
+                "solveTime": sum(r["solveTime"] for r in rounds)}
+
+    def printSummary(self):
+        summary = self.summary()
+        pricing = summary["buildTime"] + summary["solveTime"]
+        print("%d rounds, %d columns: master %.2f s, pricing %.2f s (build %.2f s, solve %.2f s)" %
+              (summary["rounds"], summary["columnsAdded"], summary["masterTime"], pricing,
+               summary["buildTime"], summary["solveTime"]))
+
+
+class JSONLSink:
+    '''
+    Callback writing each record as one line of a JSON Lines file.
+    '''
+
+    def __init__(self, filename):
+        self.fd = open(filename, "w")
+
+    def __call__(self, record):
+        self.fd.write(json.dumps(record) + "\n")
+        self.fd.flush()
+
+    def close(self):
+        self.fd.close()
+
+
+class MetricsRegistry:
+    '''
+    In-process registry of counters and gauges in the style of
+    Prometheus, updated by each record. render() gives the text
+    exposition format, so it can be served or dumped as is.
+    '''
+
+    # (metric, type, help) of the registry:
+    metrics = [
+        ("vrp_pricing_rounds_total", "counter", "Pricing rounds, by tier"),
+        ("vrp_columns_added_total", "counter", "Columns added to the master"),
+        ("vrp_master_seconds_total", "counter", "Time in the master LP"),
+        ("vrp_pricing_build_seconds_total", "counter", "Time building the pricing problem"),
+        ("vrp_pricing_solve_seconds_total", "counter", "Time solving the pricing problem"),
+        ("vrp_columns", "gauge", "Columns in the master"),
+        ("vrp_lp_objective", "gauge", "Objective of the master LP"),
+        ("vrp_lagrangian_bound", "gauge", "Best Lagrangian bound of the node"),
+        ("vrp_min_reduced_cost", "gauge", "Most negative reduced cost of the last round"),
+        ("vrp_eliminated_arcs", "gauge", "Arcs removed from the pricing"),
+    ]
+
+    def __init__(self):
+        self.values = {}  # (metric, labels) -> value, labels as a sorted tuple
+
+    def inc(self, metric, value=1.0, **labels):
+        key = (metric, tuple(sorted(labels.items())))
+        self.values[key] = self.values.get(key, 0.0) + value
+
+    def set(self, metric, value, **labels):
+        if value is not None:
+            self.values[metric, tuple(sorted(labels.items()))] = float(value)
+
+    def get(self, metric, **labels):
+        return self.values.get((metric, tuple(sorted(labels.items()))))
+
+    def __call__(self, record):
+        self.inc("vrp_pricing_rounds_total", tier=record["tier"] or "none")
+        self.inc("vrp_columns_added_total", record["columnsAdded"])
+        self.inc("vrp_master_seconds_total", record["masterTime"])
+        self.inc("vrp_pricing_build_seconds_total", record["buildTime"])
+        self.inc("vrp_pricing_solve_seconds_total", record["solveTime"])
+        self.set("vrp_columns", record["columns"])
+        self.set("vrp_lp_objective", record["lpObj"])
+        self.set("vrp_lagrangian_bound", record["lagrangianBound"])
+        self.set("vrp_min_reduced_cost", record["minRedCost"])
+        self.set("vrp_eliminated_arcs", record["eliminatedArcs"])
+
+    def render(self):
+        lines = []
+        for metric, kind, description in self.metrics:
+            samples = sorted((labels, value) for (name, labels), value in self.values.items()
+                             if name == metric)
+            if not samples:
+                continue
+
+            lines.append("# HELP %s %s" % (metric, description))
+            lines.append("# TYPE %s %s" % (metric, kind))
+            for labels, value in samples:
+                labelText = ",".join('%s="%s"' % label for label in labels)
+                lines.append("%s%s %r" % (metric, "{%s}" % labelText if labelText else "", value))
+
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,158 @@
+'''
+Compact representation of the routes (patterns) of the VRP column
+generation.
+'''
+
+import json
+
+
+class Route:
+    '''
+    A route leaving and returning to the depot. The cost, the load and the
+    set of visited clients are computed once, when the route is created.
+    Iterating over a route yields its edges (i, j), so it can be used
+    wherever the former edge-list patterns were used.
+    '''
+    __slots__ = ("nodes", "rows", "cost", "load", "clients", "clientSet", "mask")
+
+    def __init__(self, rows, data):
+        '''
+        @param rows - rows of the DataVRP arrays: [depot, r1, ..., rk, depot].
+        @param data - DataVRP object.
+        '''
+        rows = tuple(int(r) for r in rows)
+        ids = data.ids
+
+        self.rows = rows
+        self.nodes = tuple(int(ids[r]) for r in rows)  # Node ids
+        self.cost = float(data.dist[rows[:-1], rows[1:]].sum())
+        self.load = int(data.demand[list(rows)].sum())
+
+        clientRows = sorted(set(rows) - {data.depotIndex})
+        self.clients = tuple(int(ids[r]) for r in clientRows)  # Sparse incidence
+        self.clientSet = frozenset(self.clients)
+        self.mask = sum(1 << r for r in clientRows)  # Incidence bitset over rows
+
+    @classmethod
+    def fromNodes(cls, nodes, data):
+        return cls([data.index[i] for i in nodes], data)
+
+    @classmethod
+    def fromEdges(cls, edges, data):
+        '''
+        Builds a route from a list of edges (i, j) given in any order.
+        '''
+        successor = dict(edges)
+        nodes = [data.depot]
+        while len(nodes) == 1 or nodes[-1] != data.depot:
+            nodes.append(successor[nodes[-1]])
+
+        return cls.fromNodes(nodes, data)
+
+    def edges(self):
+        return list(zip(self.nodes, self.nodes[1:]))
+
+    def visits(self, client):
+        return client in self.clientSet
+
+    def __iter__(self):
+        return iter(self.edges())
+
+    def __len__(self):
+        return len(self.nodes) - 1
+
+    def __repr__(self):
+        return "Route(%s)" % "-".join(str(i) for i in self.nodes)
+
+
+class ColumnPool:
+    '''
+    Pool of routes keyed by their set of clients. Only the cheapest
+    sequence of each client set is kept, so duplicates are detected in
+    O(1). The pool also keeps, for each route, how many pricing rounds in
+    a row it was not used by the master LP (its age), so routes that stay
+    inactive can be evicted.
+    '''
+
+    def __init__(self, maxAge=None):
+        '''
+        @param maxAge - routes inactive for more rounds than this are removed
+        by evict. None keeps every route.
+        '''
+        self.maxAge = maxAge
+        self.routes = {}  # Sorted client tuple -> Route
+        self.age = {}  # Sorted client tuple -> rounds without being used
+
+    def improves(self, route):
+        '''
+        @return - True if the route is new or cheaper than the pooled route
+        with the same clients.
+        '''
+        current = self.routes.get(route.clients)
+        return current is None or route.cost < current.cost - 1e-9
+
+    def add(self, route):
+        '''
+        Adds the route if it improves the pool (see improves).
+        @return - whether the route was added.
+        '''
+        if not self.improves(route):
+            return False
+
+        self.routes[route.clients] = route
+        self.age[route.clients] = 0
+        return True
+
+    def touch(self, route, active):
+        key = route.clients
+        if key in self.age:
+            self.age[key] = 0 if active else self.age[key] + 1
+
+    def evict(self):
+        '''
+        Removes the routes (with more than one client) older than maxAge.
+        @return - the removed routes.
+        '''
+        if self.maxAge is None:
+            return []
+
+        # Single-client routes keep the master feasible and are never removed:
+        old = [key for key, age in self.age.items() if age > self.maxAge and len(key) > 1]
+        removed = [self.routes.pop(key) for key in old]
+        for key in old:
+            del self.age[key]
+
+        return removed
+
+    def save(self, filename, data):
+        with open(filename, "w") as fd:
+            json.dump({"instance": data.name,
+                       "dimension": len(data.ids),
+                       "routes": [list(route.nodes) for route in self.routes.values()],
+                       "age": list(self.age.values())}, fd)
+
+    @classmethod
+    def load(cls, filename, data, maxAge=None):
+        with open(filename) as fd:
+            saved = json.load(fd)
+
+        if saved["instance"] != data.name or saved["dimension"] != len(data.ids):
+            raise ValueError("Column pool %s was saved for instance %s" %
+                             (filename, saved["instance"]))
+
+        pool = cls(maxAge)
+        for nodes, age in zip(saved["routes"], saved["age"]):
+            route = Route.fromNodes(nodes, data)
+            if pool.add(route):
+                pool.age[route.clients] = age
+
+        return pool
+
+    def __len__(self):
+        return len(self.routes)
+
+    def __iter__(self):
+        return iter(self.routes.values())
+
+    def __contains__(self, route):
+        return route.clients in self.routes
@@ -1,79 +1,9 @@
 from pyscipopt import Model, quicksum, Pricer, SCIP_RESULT, SCIP_PARAMSETTING
 
-# Using networkx for drawing the solution:
-import networkx as nx
-import matplotlib.pyplot as plt
-
 import numpy as np
 
-
-class DataVRP:
-    cap = None  # Capacity of the truck
-    nodes = {}  # Position of the nodes
-    depots = None  # We are assuming one depot
-    demands = {}  # Demand for each node. Demand of the depot is zero
-    costs = {}  # Costs from going from i to j
-    
-    def __init__(self, filename):
-        
-        with open(filename) as fd:
-            lines = fd.readlines()
-
-        i = 0
-        size = None  # Number of nodes
-        while i < len(lines):
-            line = lines[i]
-
-            if line.find("DIMENSION") > -1:
-                size = self.sepIntValue(line)
-            elif line.find("CAPACITY") > -1:
-                self.cap = self.sepIntValue(line)            
-            elif line.find("NODE_COORD_SECTION") > -1:
-                i += 1
-                line = lines[i]
-                for _ in range(size):
-                    n, x, y = [int(val.strip()) for val in line.split()]
-                    i += 1  # Last step starts the DEMAND_SECTION
-                    self.nodes[n] = (x, y)
-                    line = lines[i]
-
-            # Not elif because of NODE_COORD_SECTION process.
-            if line.find("DEMAND_SECTION") > -1:
-                i += 1
-                line = lines[i]
-                for _ in range(size):
-                    n, dem = [int(val.strip()) for val in line.split()]
-                    i += 1
-                    self.demands[n] = dem
-                    line = lines[i]
-
-            if line.find("DEPOT_SECTION") > -1:
-                i += 1
-                depots = []
-                
-                depot = int(lines[i].strip())
-                while depot >= 0:
-                    depots.append(depot)
-                    i += 1
-                    depot = int(lines[i].strip())
-                
-                assert(len(depots) == 1)
-
-                self.depot = depots[0]
-            
-            i += 1
-
-        self.computeCostMatrix()
-
-
-    def sepIntValue(self, line):
-        value = line.split(":")[-1].strip()
-        return int(value)
-
-    def computeCostMatrix(self):
-        for (p1, (x1, y1)) in self.nodes.items():
-            for (p2, (x2, y2)) in self.nodes.items():
-                self.costs[p1, p2] = ((x1 - x2)**2 + (y1 - y2)**2)**0.5
+from vrp_data import DataVRP
+from vrp_draw import drawEdges
 
 
 class VRPpricer(Pricer):
@@ -247,6 +177,9 @@ class VRPsolver:
     # If it is True, we solve the problem of selecting
     # the best patterns to use -- without column generation.
     integer = False 
+
+    # Extra SCIP parameters of the master (e.g. {"lp/threads": 1}):
+    scipParams = None
     
     def __init__(self, vrpData, maxPatterns):
         self.data = vrpData
@@ -334,6 +267,9 @@ class VRPsolver:
             master.includePricer(pricer, "VRP pricer", "Identifying new routes")
 
             self.pricer = pricer
+
+        if self.scipParams:
+            master.setParams(self.scipParams)
             
         self.master = master  # Save master model.
         
@@ -354,17 +290,13 @@ class VRPsolver:
 
         return usedPatterns
 
-    def drawSolution(self):
+    def drawSolution(self, filename=None):
+        '''
+        Shows the routes of the solution, or saves the drawing to filename
+        (see vrp_draw.drawEdges).
+        '''
         patterns = self.printSolution()
-        graph = nx.DiGraph()
-
-        for pat in patterns:
-            graph.add_edges_from(pat)
-
-        nx.draw_networkx_nodes(graph, self.data.nodes)
-        nx.draw_networkx_edges(graph, self.data.nodes)
-        nx.draw_networkx_labels(graph, self.data.nodes)
-        plt.show()
+        drawEdges([edge for pat in patterns for edge in pat], self.data.nodes, filename)
         
 
 if __name__ == "__main__":
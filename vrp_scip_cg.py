@@ -1,79 +1,15 @@
-from pyscipopt import Model, quicksum, Pricer, SCIP_RESULT, SCIP_PARAMSETTING
+from pyscipopt import Model, quicksum, Branchrule, Pricer, SCIP_RESULT, SCIP_PARAMSETTING
 
-# Using networkx for drawing the solution:
-import networkx as nx
-import matplotlib.pyplot as plt
+import os
+import time
 
 import numpy as np
 
-
-class DataVRP:
-    cap = None  # Capacity of the truck
-    nodes = {}  # Position of the nodes
-    depots = None  # We are assuming one depot
-    demands = {}  # Demand for each node. Demand of the depot is zero
-    costs = {}  # Costs from going from i to j
-    
-    def __init__(self, filename):
-        
-        with open(filename) as fd:
-            lines = fd.readlines()
-
-        i = 0
-        size = None  # Number of nodes
-        while i < len(lines):
-            line = lines[i]
-
-            if line.find("DIMENSION") > -1:
-                size = self.sepIntValue(line)
-            elif line.find("CAPACITY") > -1:
-                self.cap = self.sepIntValue(line)            
-            elif line.find("NODE_COORD_SECTION") > -1:
-                i += 1
-                line = lines[i]
-                for _ in range(size):
-                    n, x, y = [int(val.strip()) for val in line.split()]
-                    i += 1  # Last step starts the DEMAND_SECTION
-                    self.nodes[n] = (x, y)
-                    line = lines[i]
-
-            # Not elif because of NODE_COORD_SECTION process.
-            if line.find("DEMAND_SECTION") > -1:
-                i += 1
-                line = lines[i]
-                for _ in range(size):
-                    n, dem = [int(val.strip()) for val in line.split()]
-                    i += 1
-                    self.demands[n] = dem
-                    line = lines[i]
-
-            if line.find("DEPOT_SECTION") > -1:
-                i += 1
-                depots = []
-                
-                depot = int(lines[i].strip())
-                while depot >= 0:
-                    depots.append(depot)
-                    i += 1
-                    depot = int(lines[i].strip())
-                
-                assert(len(depots) == 1)
-
-                self.depot = depots[0]
-            
-            i += 1
-
-        self.computeCostMatrix()
-
-
-    def sepIntValue(self, line):
-        value = line.split(":")[-1].strip()
-        return int(value)
-
-    def computeCostMatrix(self):
-        for (p1, (x1, y1)) in self.nodes.items():
-            for (p2, (x2, y2)) in self.nodes.items():
-                self.costs[p1, p2] = ((x1 - x2)**2 + (y1 - y2)**2)**0.5
+from vrp_data import DataVRP
+from vrp_draw import drawEdges
+from vrp_heuristics import improveRoute, nearestNeighbourRoutes, routeReducedCost, savingsSolution
+from vrp_labeling import LabelingPricer, qRouteArcBounds
+from vrp_routes import ColumnPool, Route
 
 
 class VRPpricer(Pricer):
@@ -85,6 +21,9 @@ class VRPpricer(Pricer):
     # Data object with input data for the problem:
     data = None
 
+    # Client constraints of the master, keyed by client:
+    cons = None
+
     # Patterns currently in the problem:
     patterns = None
 
@@ -98,29 +37,145 @@ class VRPpricer(Pricer):
     # List of client nodes:
     clientNodes = []
 
-    # Model that holds the sub-problem:
+    # Model that holds the sub-problem, built once (see buildSubMIP), with
+    # its x_ij and u_i variables and the constraints of the required edges:
     subMIP = None
+    subMIPx = None
+    subMIPu = None
+    subMIPArcs = None
+    subMIPRules = None
+    subMIPRuleCons = None
+
+    # Best route of the last sub-MIP, used as its next starting solution:
+    lastMIPRoute = None
+
+    # If set, the sub-MIP starts from the arcs to the neighbours nearest
+    # nodes of each node (see DataVRP.nearestNeighbourArcs):
+    neighbours = None
 
     # Maximum number of patterns to be created:
     maxPatterns = np.Inf
-    
+
+    # How the sub-problem is solved: "labeling" (ESPPRC labeling
+    # algorithm) or "mip" (MTZ sub-MIP solved by SCIP):
+    pricing = "labeling"
+
+    # Labeling algorithm used when pricing == "labeling":
+    labeling = None
+
+    # Maximum number of columns added in one pricing round:
+    maxColumnsPerRound = 1
+
+    # Tiers tried in each pricing round, the exact one is always last:
+    tiers = ("greedy", "localSearch", "exact")
+
+    # Number of patterns (with the smallest reduced cost) improved by the
+    # local search tier:
+    localSearchPatterns = 20
+
+    # Calls, hits (rounds in which the tier found columns), columns and
+    # time of each tier:
+    tierStats = None
+
+    # Dual stabilization by Wentges smoothing. The pricing uses the duals
+    # smoothing*center + (1 - smoothing)*lpDuals, in which center is the
+    # dual vector with the best Lagrangian bound so far:
+    stabilization = False
+    smoothing = 0.5
+    stabilityCenter = None
+
+    # Best Lagrangian bound and the reduced-cost lower bound of the last
+    # exact pricing:
+    lagrangianBound = -np.inf
+    lastLowerBound = None
+
+    # Pricing stops when (lpObj - lagrangianBound)/|lpObj| <= gapTolerance:
+    gapTolerance = None
+
+    pricingRounds = 0
+    mispricings = 0
+
+    # Column pool of the solver, used to skip duplicate routes and to
+    # track how long each column stays out of the LP solution:
+    pool = None
+
+    # Node sequences (rows) of the columns in the master:
+    columnRows = None
+
+    # Branch-and-price: the columns are binary and the edge decisions
+    # (i, j, value) of each node, keyed by node number, are enforced
+    # by the pricing (see EdgeBranching):
+    branchAndPrice = False
+    decisions = None
+    rulesByNode = None
+
+    # Node being priced and its rules (see getNodeRules), None when every
+    # route is allowed:
+    currentNode = None
+    rules = None
+
+    # Arc costs of the pricing problem. Farkas pricing uses zero costs:
+    arcCosts = None
+
+    # Reduced-cost arc elimination (see eliminateArcs): the cost of a known
+    # solution, the arcs proven to be in no cheaper solution and, for each
+    # round, (round, eliminated arcs, gap):
+    arcElimination = True
+    upperBound = np.inf
+    eliminated = None
+    eliminationLog = None
+
+    # Instrumentation (see vrp_monitor.PricingMonitor), None to disable.
+    # The tier of the last pricing, the time spent building the pricing
+    # problem in the current round and the end of the previous round (or of
+    # pricerinit, before the first master LP):
+    monitor = None
+    lastTier = None
+    buildTime = 0.0
+    lastRoundEnd = None
+
     def __init__(self, z, cons, data, patterns,
-                 costs, isClientVisited, patCost, maxPatterns):
-        
+                 costs, isClientVisited, patCost, maxPatterns,
+                 pricing="labeling", maxColumnsPerRound=30,
+                 heuristicPricing=True, stabilization=False, gapTolerance=None,
+                 pool=None, branchAndPrice=False, neighbours=None):
+
         self.z, self.cons, self.data, self.patterns = z, cons, data, patterns
+        self.pool = pool
+        self.columnRows = {pattern.rows for pattern in patterns}
+        self.branchAndPrice = branchAndPrice
+        self.neighbours = neighbours
+        self.decisions = {}
+        self.rulesByNode = {}
+        self.eliminationLog = []
+        self.arcCosts = data.dist
         self.isClientVisited = isClientVisited
         self.patCost = patCost
         self.maxPatterns = maxPatterns
-
-        for i in data.nodes:
-            if i != data.depot:
-                self.clientNodes.append(i)
+        self.pricing = pricing
+        self.maxColumnsPerRound = maxColumnsPerRound
+        self.stabilization = stabilization
+        self.gapTolerance = gapTolerance
+
+        if not heuristicPricing:
+            self.tiers = ("exact",)
+        self.tierStats = {tier: {"calls": 0, "hits": 0, "columns": 0, "time": 0.0}
+                          for tier in self.tiers}
+
+        self.clientNodes = [i for i in data.nodes if i != data.depot]
+
+        if pricing == "labeling":
+            self.labeling = LabelingPricer(data.dist, data.demand, data.cap,
+                                           data.depotIndex,
+                                           maxRoutes=maxColumnsPerRound)
         super()
 
     def pricerredcost(self):
         '''
         This is a method from the Pricer class.
-        It is used for adding a new column to the problem.
+        It is used for adding new columns to the problem. Every route
+        of negative reduced cost found in the round is added, up to
+        maxColumnsPerRound.
         '''
 
         # Maximum number of patterns reached:
@@ -129,98 +184,756 @@ class VRPpricer(Pricer):
             print("Max patterns reached!")
             return {'result': SCIP_RESULT.SUCCESS}
         
-        colRedCos, pattern = self.getColumnFromMIP(30)  # 30 seconds of time limit
+        start = time.time()
+        self.buildTime = 0.0
+        self.enterNode()
+        dualSols = self.getDualSolutions()
+        self.pricingRounds += 1
+        self.updateColumnActivity()
+
+        lowerBound = None
+        if self.stabilization:
+            columns = self.getStabilizedColumns(dualSols)
+        else:
+            columns, lowerBound = self.getColumnsFromTiers(dualSols)
+            if lowerBound is not None:
+                self.updateLagrangianBound(dualSols, lowerBound)
+                self.eliminateArcs(dualSols, lowerBound)
+
+        added = len(self.patterns)
+        for colRedCos, pattern in columns[:self.maxColumnsPerRound]:
+            if colRedCos >= -0.00001 or len(self.patterns) >= self.maxPatterns:
+                break
+
+            self.addColumn(pattern)
 
-        if colRedCos < -0.00001:
+        if self.monitor is not None:
+            self.recordRound(start, columns, lowerBound, len(self.patterns) - added)
 
-            newPattern = pattern
-            obj = self.patCost(newPattern)
-            curVar = len(self.z)
-            newVar = self.model.addVar("New_" + str(curVar), vtype="C",
-                                       lb=0.0, ub=1.0, obj=obj,
-                                       pricedVar=True)
+        result = {'result': SCIP_RESULT.SUCCESS}
+        if self.lagrangianBound > -np.inf:
+            result['lowerbound'] = self.lagrangianBound
 
-            for cs in self.cons:
+            if self.gapTolerance is not None:
+                lpObj = self.model.getLPObjVal()
+                if lpObj - self.lagrangianBound <= self.gapTolerance*max(abs(lpObj), 1.0):
+                    print("Lagrangian gap closed")
+                    result['stopearly'] = True
 
-                # Get client from constraint name:
-                client = int(cs.name.split("_")[-1].strip())
-                coeff = self.isClientVisited(client, newPattern)
-                self.model.addConsCoeff(cs, newVar, coeff)
+        return result
 
-            self.patterns.append(newPattern)
-            self.z[curVar] = newVar
+    def pricerfarkas(self):
+        '''
+        Called when the master LP of a node is infeasible, which happens
+        when branching removes the columns covering some client. Looks for
+        routes with negative Farkas value, i.e. reduced cost computed with
+        zero arc costs and the Farkas duals.
+        '''
+        start = time.time()
+        self.buildTime = 0.0
+        self.enterNode()
+        farkasSols = {client: self.model.getDualfarkasLinear(c)
+                      for client, c in self.cons.items()}
+
+        self.arcCosts = np.zeros_like(self.data.dist)
+        try:
+            # Only the exact tier without heuristicPricing:
+            tiers = tuple(tier for tier in ("greedy", "exact") if tier in self.tierStats)
+            columns, _ = self.getColumnsFromTiers(farkasSols, tiers)
+        finally:
+            self.arcCosts = self.data.dist
+
+        added = len(self.patterns)
+        for _, pattern in columns[:self.maxColumnsPerRound]:
+            self.addColumn(pattern)
+
+        if self.monitor is not None:
+            self.recordRound(start, columns, None, len(self.patterns) - added, farkas=True)
 
         return {'result': SCIP_RESULT.SUCCESS}
 
+    def recordRound(self, start, columns, lowerBound, added, farkas=False):
+        '''
+        Passes the record of the round (see vrp_monitor) to the monitor.
+        @param start - time at which the round started.
+        '''
+        end = time.time()
+        pricingTime = end - start
+        masterTime = start - self.lastRoundEnd
+        self.lastRoundEnd = end
+
+        self.monitor.record({
+            "round": self.pricingRounds,
+            "node": self.currentNode,
+            "farkas": farkas,
+            "masterTime": masterTime,
+            "buildTime": self.buildTime,
+            "solveTime": pricingTime - self.buildTime,
+            "tier": self.lastTier,
+            "minRedCost": float(columns[0][0]) if columns else None,
+            "lowerBound": lowerBound,
+            "columnsAdded": added,
+            "columns": len(self.patterns),
+            "lpObj": None if farkas else self.model.getLPObjVal(),
+            "lagrangianBound": self.lagrangianBound if self.lagrangianBound > -np.inf else None,
+            "eliminatedArcs": int(self.eliminated.sum()) if self.eliminated is not None else 0})
+
+    def enterNode(self):
+        '''
+        Loads the edge decisions of the current node. The Lagrangian bound
+        and the stability center are only valid inside one node.
+        '''
+        node = self.model.getCurrentNode().getNumber()
+        if node == self.currentNode:
+            return
+
+        # A node is never priced again once left, its children keep
+        # their own copy of the decisions:
+        self.decisions.pop(self.currentNode, None)
+        self.rulesByNode.pop(self.currentNode, None)
+
+        self.currentNode = node
+        self.rules = self.getNodeRules(node)
+        self.lagrangianBound = -np.inf
+        self.stabilityCenter = None
+
+    def getNodeRules(self, node):
+        '''
+        @return - (forbidden, requiredEdges) for the decisions of the node, or
+        None if it has none. forbidden is an (n, n) boolean matrix with the
+        arcs that no column may use: both arcs of the edges fixed to 0, and
+        every other arc of a client with two required edges. requiredEdges
+        are the edges fixed to 1, which any route visiting one of their
+        clients must use.
+        '''
+        decisions = self.decisions.get(node)
+        if not decisions:
+            return None
+
+        if node not in self.rulesByNode:
+            n, depot = len(self.data.ids), self.data.depotIndex
+            forbidden = np.zeros((n, n), dtype=bool)
+            requiredEdges = tuple((i, j) for i, j, value in decisions if value == 1)
+
+            neighbours = {}
+            for i, j in requiredEdges:
+                neighbours.setdefault(i, []).append(j)
+                neighbours.setdefault(j, []).append(i)
+
+            for i, adjacent in neighbours.items():
+                if i != depot and len(adjacent) == 2:
+                    forbidden[i, :] = forbidden[:, i] = True
+                    forbidden[i, adjacent] = forbidden[adjacent, i] = False
+
+            for i, j, value in decisions:
+                if value == 0:
+                    forbidden[i, j] = forbidden[j, i] = True
+
+            self.rulesByNode[node] = (forbidden, requiredEdges)
+
+        return self.rulesByNode[node]
+
+    def isAllowed(self, pattern, rules=None):
+        if rules is None:
+            rules = self.rules
+        if rules is None:
+            return True
+
+        forbidden, requiredEdges = rules
+        rows = pattern.rows
+        if forbidden[rows[:-1], rows[1:]].any():
+            return False
+
+        depot = self.data.depotIndex
+        for i, j in requiredEdges:
+            visited = (i != depot and pattern.mask >> i & 1) or \
+                (j != depot and pattern.mask >> j & 1)
+            if visited and (i, j) not in zip(rows, rows[1:]) and (j, i) not in zip(rows, rows[1:]):
+                return False
+
+        return True
+
+    def getColumnsFromTiers(self, dualSols, tiers=None):
+        '''
+        Cheap tiers first, the exact pricing only runs when they fail.
+        @return - (columns, lowerBound) in which lowerBound is the lower bound
+        on the reduced cost given by the exact tier, or None when it did not
+        run.
+        '''
+        columns, tier = [], None
+        for tier in tiers if tiers is not None else self.tiers:
+            start = time.time()
+            # The heuristics do not know about the edges required by branching:
+            columns = [column for column in self.getColumnsFromTier(tier, dualSols)
+                       if column[0] < -0.00001 and self.isNewColumn(column[1])
+                       and self.isAllowed(column[1])]
+
+            self.lastTier = tier
+            stats = self.tierStats[tier]
+            stats["calls"] += 1
+            stats["time"] += time.time() - start
+            if columns:
+                stats["hits"] += 1
+                stats["columns"] += min(len(columns), self.maxColumnsPerRound)
+                break
+
+        return columns, self.lastLowerBound if tier == "exact" else None
+
+    def getStabilizedColumns(self, dualSols):
+        '''
+        Pricing with Wentges smoothing. The heuristic tiers use the LP duals;
+        only the exact tier is smoothed. Columns found with the smoothed duals
+        are only kept if they also have negative reduced cost with the LP
+        duals. Otherwise (mispricing) the smoothed duals are moved toward the
+        LP duals, down to the LP duals themselves, so no column is missed.
+        '''
+        if len(self.tiers) > 1:
+            columns, _ = self.getColumnsFromTiers(dualSols, self.tiers[:-1])
+            if columns:
+                return columns
+
+        if self.stabilityCenter is None:
+            self.stabilityCenter = dict(dualSols)
+
+        alpha = self.smoothing
+        step = 1
+        while True:
+            smoothed = {i: alpha*self.stabilityCenter[i] + (1 - alpha)*dual
+                        for i, dual in dualSols.items()}
+
+            columns, lowerBound = self.getColumnsFromTiers(smoothed, ("exact",))
+            if lowerBound is not None:
+                self.updateLagrangianBound(smoothed, lowerBound)
+                self.eliminateArcs(smoothed, lowerBound)
+
+            columns = [(self.patternReducedCost(pattern, dualSols), pattern)
+                       for _, pattern in columns]
+            columns = sorted((column for column in columns if column[0] < -0.00001),
+                             key=lambda column: column[0])
+
+            if columns or alpha == 0.0:
+                return columns
+
+            self.mispricings += 1
+            step += 1
+            alpha = max(0.0, 1.0 - step*(1.0 - self.smoothing))
+
+    def updateLagrangianBound(self, dualSols, minRedCost):
+        '''
+        Lagrangian bound of the master for the duals dualSols:
+        sum(duals) + K*min(0, minRedCost), in which K bounds the number of
+        routes of a solution (each route visits at least one client).
+        The best duals become the stability center.
+        '''
+        bound = sum(dualSols.values()) + len(self.clientNodes)*min(0.0, minRedCost)
+        if bound > self.lagrangianBound:
+            self.lagrangianBound = bound
+            self.stabilityCenter = dict(dualSols)
+
+    def eliminateArcs(self, dualSols, minRedCost):
+        '''
+        A solution using arc (i, j) costs at least
+        sum(duals) + rc_ij + (K - 1)*min(0, minRedCost), in which rc_ij bounds
+        the reduced cost of the routes through (i, j) (see
+        vrp_labeling.qRouteArcBounds). Arcs for which this is not below the
+        upper bound are removed from the pricing for good. In
+        branch-and-price this is only done at the root, whose bound holds
+        in every node.
+        '''
+        upperBound = self.upperBound
+        if self.branchAndPrice:
+            if self.model.getCurrentNode().getDepth() > 0:
+                return
+            upperBound = min(upperBound, self.model.getPrimalbound())
+
+        demand = self.data.demand
+        if not self.arcElimination or upperBound == np.inf or \
+                (np.delete(demand, self.data.depotIndex) <= 0).any():
+            return
+
+        redCost = self.getReducedCostMatrix(dualSols)
+        bounds = qRouteArcBounds(redCost, demand, self.data.cap, self.data.depotIndex)
+
+        nRoutes = len(self.clientNodes)
+        base = sum(dualSols.values()) + (nRoutes - 1)*min(0.0, minRedCost)
+        eliminated = base + bounds >= upperBound - 1e-6
+        np.fill_diagonal(eliminated, False)
+
+        if self.eliminated is not None:
+            eliminated |= self.eliminated
+        self.eliminated = eliminated
+
+        n = len(demand)
+        gap = upperBound - (sum(dualSols.values()) + nRoutes*min(0.0, minRedCost))
+        self.eliminationLog.append((self.pricingRounds, int(eliminated.sum()), gap))
+        print("Arc elimination: %d of %d arcs removed (gap %.2f)" %
+              (eliminated.sum(), n*(n - 1), gap))
+
+    def patternReducedCost(self, pattern, dualSols):
+        return pattern.cost - sum(dualSols[i] for i in pattern.clients)
+
+    def getColumnsFromTier(self, tier, dualSols):
+        if tier == "greedy":
+            return self.getColumnsFromGreedy(dualSols)
+        elif tier == "localSearch":
+            return self.getColumnsFromLocalSearch(dualSols)
+        elif self.pricing == "labeling":
+            return self.getColumnsFromLabeling(dualSols)
+        else:
+            return self.getColumnsFromMIP(30, dualSols)  # 30 seconds of time limit
+
+    def printPricingStats(self):
+        print("%-12s %8s %8s %10s %10s" % ("tier", "calls", "hit rate", "columns", "time (s)"))
+        for tier in self.tiers:
+            stats = self.tierStats[tier]
+            hitRate = stats["hits"]/stats["calls"] if stats["calls"] else 0.0
+            print("%-12s %8d %8.2f %10d %10.2f" % (tier, stats["calls"], hitRate,
+                                                  stats["columns"], stats["time"]))
+
+    def addColumn(self, newPattern):
+        '''
+        Adds a Route (or an edge list) as a new column of the master.
+        '''
+        if not isinstance(newPattern, Route):
+            newPattern = Route.fromEdges(newPattern, self.data)
+
+        if not self.isNewColumn(newPattern):
+            return  # A route with the same clients is already there
+
+        if self.pool is not None:
+            self.pool.add(newPattern)
+
+        obj = self.patCost(newPattern)
+        curVar = len(self.z)
+        newVar = self.model.addVar("New_" + str(curVar),
+                                   vtype="B" if self.branchAndPrice else "C",
+                                   lb=0.0, ub=1.0, obj=obj,
+                                   pricedVar=True)
+
+        # Only the constraints of the clients visited by the route:
+        for client in newPattern.clients:
+            self.model.addConsCoeff(self.cons[client], newVar, 1.0)
+
+        self.patterns.append(newPattern)
+        self.columnRows.add(newPattern.rows)
+        self.z[curVar] = newVar
+
+        if self.decisions:
+            # The column is global, so the open nodes whose decisions
+            # it breaks must not use it:
+            leaves, children, siblings = self.model.getOpenNodes()
+            for node in leaves + children + siblings:
+                rules = self.getNodeRules(node.getNumber())
+                if rules is not None and not self.isAllowed(newPattern, rules):
+                    self.model.chgVarUbNode(node, newVar, 0.0)
+
+    def isNewColumn(self, pattern):
+        '''
+        A route is only worth adding if the pool has no route with the same
+        clients that is at least as cheap. Such a duplicate can still show a
+        negative reduced cost when its twin sits at its upper bound.
+        '''
+        if not isinstance(pattern, Route):
+            pattern = Route.fromEdges(pattern, self.data)
+
+        if pattern.rows in self.columnRows:
+            return False
+        if self.pool is None:
+            return True
+
+        # In branch-and-price the pooled twin may be forbidden in this node:
+        twin = self.pool.routes.get(pattern.clients)
+        return self.pool.improves(pattern) or not self.isAllowed(twin)
+
+    def updateColumnActivity(self):
+        '''
+        Ages the pooled columns that are not used by the current LP solution.
+        '''
+        if self.pool is None:
+            return
+
+        for i, var in self.z.items():
+            self.pool.touch(self.patterns[i], var.getLPSol() > 1e-9)
+
     def pricerinit(self):
         '''
         A method of the Pricer class. It is used to convert
         the problem into its original form.
         '''
-        for i, c in enumerate(self.cons):
-            self.cons[i] = self.model.getTransformedCons(c)
+        for client, c in self.cons.items():
+            self.cons[client] = self.model.getTransformedCons(c)
 
-    def getColumnFromMIP(self, timeLimit):
+        # Branching fixes the columns in the nodes, which needs the
+        # transformed variables:
+        for i, var in self.z.items():
+            self.z[i] = self.model.getTransformedVar(var)
 
-        def getPatternFromSolution(subMIP):
-            edges = []
-            for x in subMIP.getVars():
-                if "x" in x.name:
-                    if subMIP.getVal(x) > 0.99:
-                        i, j = x.name.split("_")[1:]
-                        edges.append((int(i), int(j)))
-                    
-            return edges
+        if self.pricing == "mip":
+            self.buildSubMIP()
 
-        # Storing the values of the dual solutions:
-        dualSols = {}
-        for c in self.cons:
-            i = int(c.name.split("_")[-1].strip())
-            dualSols[i] = self.model.getDualsolLinear(c)
+        # The first round then counts the first master LP, usually the
+        # longest, in its masterTime:
+        self.lastRoundEnd = time.time()
+
+    def getDualSolutions(self):
+        # Duals of the client constraints, keyed by client:
+        return {client: self.model.getDualsolLinear(c) for client, c in self.cons.items()}
+
+    def getDualArray(self, dualSols):
+        duals = np.zeros(len(self.data.ids))
+        for i, dual in dualSols.items():
+            duals[self.data.index[i]] = dual
+
+        return duals
+
+    def getReducedCostMatrix(self, dualSols):
+        '''
+        Reduced cost of each arc (i, j), indexed by rows of the data arrays:
+        costs[i, j] - dual[i]. Loops (i, i) are not allowed.
+        '''
+        start = time.time()
+        redCost = self.arcCosts - self.getDualArray(dualSols)[:, np.newaxis]
+        np.fill_diagonal(redCost, np.inf)
+
+        if self.rules is not None:
+            redCost[self.rules[0]] = np.inf
+        if self.eliminated is not None:
+            redCost[self.eliminated] = np.inf
+
+        self.buildTime += time.time() - start
+        return redCost
+
+    def patternFromRoute(self, route):
+        '''
+        Converts a route given as rows [depot, r1, ..., rk, depot] to a
+        Route pattern.
+        '''
+        return Route(route, self.data)
+
+    def routeFromPattern(self, pattern):
+        '''
+        Inverse of patternFromRoute.
+        '''
+        return list(pattern.rows)
+
+    def getColumnsFromGreedy(self, dualSols):
+        redCost = self.getReducedCostMatrix(dualSols)
+        routes = nearestNeighbourRoutes(redCost, self.data.demand, self.data.cap,
+                                        self.data.depotIndex)
 
-        # Model for the sub-problem:
+        return [(colRedCos, self.patternFromRoute(route)) for colRedCos, route in routes]
+
+    def getColumnsFromLocalSearch(self, dualSols):
+        '''
+        Improves the reduced cost of the current patterns that are closest
+        to pricing out.
+        '''
+        dist, duals = self.data.dist, self.getDualArray(dualSols)
+
+        candidates = [(pattern.cost - duals[list(pattern.rows)].sum(), self.routeFromPattern(pattern))
+                      for pattern in self.patterns]
+        candidates.sort(key=lambda candidate: candidate[0])
+
+        routes = {}
+        for _, route in candidates[:self.localSearchPatterns]:
+            route = improveRoute(route, dist, duals, self.data.demand, self.data.cap)
+            routes[tuple(route)] = routeReducedCost(route, dist, duals)
+
+        routes = sorted((colRedCos, list(route)) for route, colRedCos in routes.items())
+
+        return [(colRedCos, self.patternFromRoute(route)) for colRedCos, route in routes]
+
+    def getColumnsFromLabeling(self, dualSols=None):
+        '''
+        @return - a list of (reducedCost, pattern) sorted by reduced cost.
+        '''
+        if dualSols is None:
+            dualSols = self.getDualSolutions()
+        redCost = self.getReducedCostMatrix(dualSols)
+
+        requiredEdges = self.rules[1] if self.rules is not None else ()
+        routes, self.lastLowerBound = self.labeling.solve(redCost, requiredEdges)
+
+        return [(colRedCos, self.patternFromRoute(route)) for colRedCos, route in routes]
+
+    def getColumnFromMIP(self, timeLimit):
+        columns = self.getColumnsFromMIP(timeLimit)
+        if not columns:
+            return 0.0, []
+
+        return columns[0]
+
+    def buildSubMIP(self):
+        '''
+        Builds the MTZ sub-MIP once. Only the objective (and, in
+        branch-and-price, the bounds and the required edge constraints)
+        change between rounds, see getColumnsFromMIP. With neighbours set,
+        the model starts from the sparse arc set of
+        DataVRP.nearestNeighbourArcs and grows with addSubMIPArcs.
+        '''
         subMIP = Model("VRP-Sub")
         subMIP.setPresolve(SCIP_PARAMSETTING.OFF)
-        subMIP.setMinimize
-
-        subMIP.setRealParam("limits/time", timeLimit)
-        
-        # Binary variables x_ij indicating whether the vehicle
-        # traverses edge (i, j)
-        x = {}
-        for i in self.data.nodes:
-            for j in self.data.nodes:
-                if i != j:
-                    x[i, j] = subMIP.addVar(vtype="B", obj=self.data.costs[i, j] - (dualSols[i] if i in self.clientNodes else 0), name="x_%d_%d" % (i, j))
+        subMIP.setMinimize()
+        subMIP.hideOutput()
 
         # Non negative variables u_i indicating the demand served up to node i:
         u = {}
         for i in self.data.nodes:
             u[i] = subMIP.addVar(vtype="C", lb=0, ub=self.data.cap, obj=0.0, name="u_%d" % i)
 
-        for j in self.clientNodes:
-            subMIP.addCons(quicksum(x[i, j] for i in self.data.nodes if i != j) <= 1)
+        # Constraints filled in by addSubMIPArcs: at most one arc enters each
+        # client, flow conservation and at most one arc leaves the depot:
+        self.subMIPIn = {j: subMIP.addCons(quicksum([]) <= 1) for j in self.clientNodes}
+        self.subMIPFlow = {h: subMIP.addCons(quicksum([]) == 0) for h in self.clientNodes}
+        self.subMIPDepot = subMIP.addCons(quicksum([]) <= 1)
+
+        self.subMIP, self.subMIPx, self.subMIPu = subMIP, {}, u
+        self.subMIPArcs = []
+        self.subMIPRules = None
+        self.subMIPRuleCons = []
+
+        ids = self.data.ids
+        if self.neighbours is None:
+            arcs = [(i, j) for i in self.data.nodes for j in self.data.nodes if i != j]
+        else:
+            arcs = [(int(ids[i]), int(ids[j]))
+                    for i, j in self.data.nearestNeighbourArcs(self.neighbours)]
 
-        for h in self.clientNodes:
-            subMIP.addCons(quicksum(x[i, h] for i in self.data.nodes if i != h) ==
-                           quicksum(x[h, i] for i in self.data.nodes if i != h))
+        self.addSubMIPArcs(arcs)
 
+    def addSubMIPArcs(self, arcs):
+        '''
+        Adds the binary variables x_ij, indicating whether the vehicle
+        traverses edge (i, j), of the given arcs (as node ids) to the sub-MIP.
+        '''
+        subMIP, x, u = self.subMIP, self.subMIPx, self.subMIPu
+        depot, index = self.data.depot, self.data.index
+        subMIP.freeTransform()
+
+        # The required edge constraints are rebuilt over the new arcs:
+        for cons in self.subMIPRuleCons:
+            subMIP.delCons(cons)
+        self.subMIPRuleCons = []
+        self.subMIPRules = None
+
+        for i, j in arcs:
+            x[i, j] = var = subMIP.addVar(vtype="B", obj=0.0, name="x_%d_%d" % (i, j))
+            self.subMIPArcs.append((var, index[i], index[j]))
+
+            if j != depot:
+                subMIP.addConsCoeff(self.subMIPIn[j], var, 1.0)
+                subMIP.addConsCoeff(self.subMIPFlow[j], var, 1.0)
+                subMIP.addCons(u[j] >= u[i] + self.data.demands[j]*var - self.data.cap*(1 - var))
+            if i != depot:
+                subMIP.addConsCoeff(self.subMIPFlow[i], var, -1.0)
+            else:
+                subMIP.addConsCoeff(self.subMIPDepot, var, 1.0)
+
+    def setSubMIPRules(self):
+        '''
+        Edges required by branching must be used by a route visiting their
+        clients. The constraints are replaced when the node changes.
+        '''
+        if self.rules is self.subMIPRules:
+            return
+
+        subMIP, x = self.subMIP, self.subMIPx
+        for cons in self.subMIPRuleCons:
+            subMIP.delCons(cons)
+        self.subMIPRuleCons = []
+        self.subMIPRules = self.rules
+
+        if self.rules is None:
+            return
+
+        ids = self.data.ids
+        for i, j in self.rules[1]:
+            a, b = int(ids[i]), int(ids[j])
+            edge = [x[arc] for arc in ((a, b), (b, a)) if arc in x]
+            for h in (a, b):
+                if h != self.data.depot:
+                    self.subMIPRuleCons.append(subMIP.addCons(
+                        quicksum(x[k, h] for k in self.data.nodes if (k, h) in x) <= quicksum(edge)))
+
+    def warmStartSubMIP(self):
+        '''
+        Gives the best route of the previous round to the sub-MIP as a
+        starting solution.
+        '''
+        route = self.lastMIPRoute
+        if route is None or not self.isAllowed(route) or \
+                any(edge not in self.subMIPx for edge in route.edges()):
+            return
+
+        subMIP = self.subMIP
+        sol = subMIP.createSol()
+        for var, _, _ in self.subMIPArcs:
+            subMIP.setSolVal(sol, var, 0.0)
+        for i, j in route.edges():
+            subMIP.setSolVal(sol, self.subMIPx[i, j], 1.0)
+
+        load = 0
         for i in self.data.nodes:
-            for j in self.clientNodes:
-                if i != j:
-                    subMIP.addCons(u[j] >= u[i] + self.data.demands[j]*x[i, j] - self.data.cap*(1 - x[i, j]))
+            subMIP.setSolVal(sol, self.subMIPu[i], 0.0)
+        for i in route.nodes[1:-1]:
+            load += self.data.demands[i]
+            subMIP.setSolVal(sol, self.subMIPu[i], load)
 
-        subMIP.addCons(quicksum(x[self.data.depot, j] for j in self.clientNodes) <= 1)
+        subMIP.addSol(sol)
+
+    def getColumnsFromMIP(self, timeLimit, dualSols=None):
+        '''
+        Solves the sub-MIP and returns every distinct route of its solution
+        pool as a list of (reducedCost, pattern) sorted by reduced cost.
+        On a sparse arc set nothing is proven until the model has every arc:
+        when it finds no column, the missing arcs with negative reduced cost
+        are added back, and then all the missing arcs.
+        '''
+        # Storing the values of the dual solutions:
+        if dualSols is None:
+            dualSols = self.getDualSolutions()
+
+        if self.subMIP is None:
+            self.buildSubMIP()
+
+        redCost = self.getReducedCostMatrix(dualSols)
+        columns = self.solveSubMIP(redCost, timeLimit)
+
+        n = len(self.data.ids)
+        while len(self.subMIPArcs) < n*(n - 1) and not columns:
+            ids = self.data.ids
+            missing = np.ones((n, n), dtype=bool)
+            np.fill_diagonal(missing, False)
+            for _, i, j in self.subMIPArcs:
+                missing[i, j] = False
+
+            negative = missing & (redCost < -0.00001)
+            arcs = np.argwhere(negative if negative.any() else missing)
+            self.addSubMIPArcs([(int(ids[i]), int(ids[j])) for i, j in arcs])
+            columns = self.solveSubMIP(redCost, timeLimit)
+
+        if len(self.subMIPArcs) < n*(n - 1):
+            # Only a bound for the routes over the current arcs:
+            self.lastLowerBound = None
+
+        status = self.subMIP.getStatus()
+        if not columns and status != "optimal":
+            # Stopped (time limit) without proving that no column is left, so
+            # the round must not end the pricing. The labeling is exact:
+            print("Sub-MIP stopped with status %s, pricing by labeling" % status)
+            if self.labeling is None:
+                data = self.data
+                self.labeling = LabelingPricer(data.dist, data.demand, data.cap,
+                                               data.depotIndex,
+                                               maxRoutes=self.maxColumnsPerRound)
+            columns = self.getColumnsFromLabeling(dualSols)
+
+        return columns
+
+    def solveSubMIP(self, redCost, timeLimit):
+        '''
+        @return - the routes of negative reduced cost in the solution pool.
+        '''
+
+        def getPatternFromSolution(subMIP, sol):
+            edges = []
+            for (i, j), x in self.subMIPx.items():
+                if subMIP.getSolVal(sol, x) > 0.99:
+                    edges.append((i, j))
+
+            return edges
+
+        # Only the objective changes from the previous round. Forbidden
+        # arcs have an infinite reduced cost:
+        start = time.time()
+        subMIP = self.subMIP
+        subMIP.freeTransform()
+        subMIP.setRealParam("limits/time", timeLimit)
+
+        allowed = redCost < np.inf
+        if self.rules is not None or self.subMIPRules is not None or self.eliminated is not None:
+            for var, i, j in self.subMIPArcs:
+                subMIP.chgVarUb(var, 1.0 if allowed[i, j] else 0.0)
+
+        arcCosts = np.where(allowed, redCost, 0.0).tolist()
+        subMIP.setObjective(quicksum(arcCosts[i][j]*var for var, i, j in self.subMIPArcs),
+                            "minimize")
+
+        self.setSubMIPRules()
+        self.warmStartSubMIP()
+        self.buildTime += time.time() - start
 
-        subMIP.hideOutput()
         subMIP.optimize()
 
-        mipSol = subMIP.getBestSol()
-        obj = subMIP.getSolObjVal(mipSol)
-        
-        pattern = getPatternFromSolution(subMIP)
-        
-        return obj, pattern
+        self.lastLowerBound = min(0.0, subMIP.getDualbound())
+
+        columns = {}
+        for sol in subMIP.getSols():
+            pattern = getPatternFromSolution(subMIP, sol)
+            key = frozenset(pattern)
+            if pattern and key not in columns and subMIP.getSolObjVal(sol) < -0.00001:
+                columns[key] = (subMIP.getSolObjVal(sol), Route.fromEdges(pattern, self.data))
+
+        columns = sorted(columns.values(), key=lambda column: column[0])
+        if columns:
+            self.lastMIPRoute = columns[0][1]
+
+        return columns
+
+
+class EdgeBranching(Branchrule):
+    '''
+    Branching on the flow of one edge {i, j}: the sum of z_r over the
+    routes r that use (i, j) or (j, i). Branching on edges instead of arcs
+    avoids exploring a route and its reverse in different subtrees. The
+    edge with the flow closest to 0.5 is forbidden in one child and
+    required in the other. The decisions are enforced by the pricer (see
+    VRPpricer.getNodeRules) and the existing columns that break them are
+    fixed to zero in the child.
+    '''
+
+    def __init__(self, pricer):
+        self.pricer = pricer
+
+    def getEdgeFlows(self):
+        pricer = self.pricer
+        n = len(pricer.data.ids)
+        flow = np.zeros((n, n))
+        for i, var in pricer.z.items():
+            value = var.getLPSol()
+            if value > 1e-9:
+                rows = pricer.patterns[i].rows
+                flow[rows[:-1], rows[1:]] += value
+
+        return np.triu(flow + flow.T, 1)
+
+    def branchexeclp(self, allowaddcons):
+        pricer = self.pricer
+        flow = self.getEdgeFlows()
+
+        fractional = (flow > 1e-6) & (flow < 1 - 1e-6)
+        if not fractional.any():
+            # Integer edge flows, let SCIP branch on the columns:
+            return {'result': SCIP_RESULT.DIDNOTRUN}
+
+        distance = np.where(fractional, np.abs(flow - 0.5), np.inf)
+        i, j = np.unravel_index(np.argmin(distance), distance.shape)
+
+        node = self.model.getCurrentNode().getNumber()
+        decisions = pricer.decisions.get(node, ())
+        estimate = self.model.getLocalEstimate()
+
+        for value in (0, 1):
+            child = self.model.createChild(0.0, estimate)
+            childNode = child.getNumber()
+            pricer.decisions[childNode] = decisions + ((int(i), int(j), value),)
+
+            rules = pricer.getNodeRules(childNode)
+            for k, var in pricer.z.items():
+                if not pricer.isAllowed(pricer.patterns[k], rules):
+                    self.model.chgVarUbNode(child, var, 0.0)
+
+        return {'result': SCIP_RESULT.BRANCHED}
 
 
 class VRPsolver:
@@ -229,7 +942,7 @@ class VRPsolver:
     clientNodes = []
 
     # A pattern is a feasible route for visiting
-    # some clients:
+    # some clients (see vrp_routes.Route):
     patterns = None
 
     # The master model:
@@ -246,53 +959,129 @@ class VRPsolver:
     # If it is True, we solve the problem of selecting
     # the best patterns to use -- without column generation.
     integer = False 
+
+    # Whether solve runs a full branch-and-price (see EdgeBranching):
+    branchAndPrice = False
     
-    def __init__(self, vrpData, maxPatterns):
+    # Pricing algorithm, see VRPpricer.pricing:
+    pricing = "labeling"
+
+    # Maximum number of columns added per pricing round:
+    maxColumnsPerRound = 30
+
+    # Whether the heuristic pricing tiers run before the exact pricing:
+    heuristicPricing = True
+
+    # Dual stabilization and early stop, see VRPpricer:
+    stabilization = False
+    gapTolerance = None
+
+    # Pool with every known route (see vrp_routes.ColumnPool) and the
+    # number of rounds a column may stay out of the LP solution before
+    # it is evicted (None keeps all of them):
+    pool = None
+    maxAge = None
+
+    # Size of the nearest neighbour arc set of the sub-MIP, None for
+    # every arc (see VRPpricer.neighbours):
+    neighbours = None
+
+    # Whether the initial patterns include the Clarke-Wright savings
+    # solution (see vrp_heuristics.savingsSolution), whose routes are
+    # kept in startRoutes and given to SCIP as the first incumbent:
+    savingsColumns = True
+    startRoutes = None
+
+    # Extra SCIP parameters of the master (e.g. {"lp/threads": 1}):
+    scipParams = None
+
+    # Called with the SCIP model just before it is optimized, e.g. to
+    # include event handlers (see vrp_benchmark.py):
+    beforeOptimize = None
+
+    # Instrumentation of the pricing rounds, see vrp_monitor.PricingMonitor:
+    monitor = None
+
+    def __init__(self, vrpData, maxPatterns, pricing="labeling", maxColumnsPerRound=30,
+                 heuristicPricing=True, stabilization=False, gapTolerance=None,
+                 neighbours=None):
         self.data = vrpData
         self.clientNodes = [n for n in self.data.nodes.keys() if n != self.data.depot]
         self.maxPatterns = maxPatterns
-        
+        self.pricing = pricing
+        self.maxColumnsPerRound = maxColumnsPerRound
+        self.heuristicPricing = heuristicPricing
+        self.stabilization = stabilization
+        self.gapTolerance = gapTolerance
+        self.neighbours = neighbours
+
     def genInitialPatterns(self):
         ''' 
-        Generating initial patterns.
+        Generating initial patterns: one route per client, which keeps the
+        master feasible, and the routes of the savings solution.
         '''      
         patterns = []
         for n in self.clientNodes:
-            patterns.append([(self.data.depot, n), (n, self.data.depot)])
+            patterns.append(Route.fromNodes([self.data.depot, n, self.data.depot], self.data))
+
+        if self.savingsColumns:
+            data = self.data
+            self.startRoutes = [Route(route, data) for route in
+                                savingsSolution(data.dist, data.demand, data.cap, data.depotIndex)]
+            patterns.extend(self.startRoutes)
+
+        self.setInitialPatterns(patterns)
 
-        self.patterns = patterns
+    def toRoute(self, pat):
+        # Edge lists are still accepted as patterns:
+        if isinstance(pat, Route):
+            return pat
+        return Route.fromEdges(pat, self.data)
 
     def setInitialPatterns(self, patterns):
-        self.patterns = patterns
+        self.pool = ColumnPool(self.maxAge)
+        self.addPatterns(patterns)
 
     def addPatterns(self, patterns):
+        # Duplicated routes are dropped by the pool:
         for pat in patterns:
-            self.patterns.append(pat)
-        
-    def patCost(self, pat):
-        cost = 0.0
+            self.pool.add(self.toRoute(pat))
+
+        self.patterns = list(self.pool)
 
-        for (i, j) in pat:
-            cost += self.data.costs[i, j]
-            
-        return cost
+    def savePool(self, filename):
+        self.pool.save(filename, self.data)
+
+    def loadPool(self, filename):
+        '''
+        Warm start from a pool saved by a previous run on the same instance.
+        '''
+        self.pool = ColumnPool.load(filename, self.data, self.maxAge)
+        self.patterns = list(self.pool)
+
+    def patCost(self, pat):
+        return pat.cost
 
     def isClientVisited(self, c, pat):
         # Check if client c if visited in pattern c:
-        for (i, j) in pat:
-            if i == c or j == c:
-                return 1
-        return 0
+        return 1 if pat.visits(c) else 0
 
-    def solve(self, integer=False):
+    def solve(self, integer=False, branchAndPrice=False):
         '''
         By default we solve a linear version of the column generation.
         If integer is True than we solve the problem of finding the best
         routes to be used without column generation.
+        If branchAndPrice is True the columns are binary and the problem
+        is solved to optimality: every node of the tree is priced and
+        branching is done on the edge flows. The columns found in a node
+        stay in the master, so its children start from them.
         '''
         self.integer = integer
+        self.branchAndPrice = branchAndPrice and not integer
         if self.patterns is None:
             self.genInitialPatterns()
+        elif self.pool.evict():
+            self.patterns = list(self.pool)
 
         # Creating master Model:
         master = Model("Master problem")
@@ -301,36 +1090,56 @@ class VRPsolver:
         if not integer:
             master.setPresolve(SCIP_PARAMSETTING.OFF)
 
+        if self.branchAndPrice:
+            # Cuts on the master would be ignored by the pricing:
+            master.setSeparating(SCIP_PARAMSETTING.OFF)
+            master.setIntParam("presolving/maxrestarts", 0)
+
+            # Best-bound node selection:
+            master.setIntParam("nodeselection/bfs/stdpriority", 1000000)
+            master.setIntParam("nodeselection/bfs/maxplungedepth", 0)
+
         # Populating master model.
+        # One (initially empty) constraint per client:
+        clientCons = {}
+        for c in self.clientNodes:
+            clientCons[c] = master.addCons(
+                quicksum([]) == 1, "Consumer_%d" % c,
+                separate=False, modifiable=True)
+
         # Binary variables z_r indicating whether
-        # pattern r is used in the solution:
+        # pattern r is used in the solution. Each one is only added
+        # to the constraints of the clients it visits:
         z = {}
 
-        for i, _ in enumerate(self.patterns):
-            z[i] = master.addVar(vtype="B" if integer else "C",
-                                 lb=0.0, ub=1.0, name="z_%d" % i)
+        for i, p in enumerate(self.patterns):
+            z[i] = master.addVar(vtype="B" if integer or self.branchAndPrice else "C",
+                                 lb=0.0, ub=1.0, obj=p.cost, name="z_%d" % i)
+            for c in p.clients:
+                master.addConsCoeff(clientCons[c], z[i], 1.0)
 
-        # Set objective:
-        master.setObjective(quicksum(self.patCost(p)*z[i] for i, p in enumerate(self.patterns)),
-                            "minimize")
-
-        clientCons = [None]*len(self.clientNodes)
-        
-        for i, c in enumerate(self.clientNodes):
-            cons = master.addCons(
-            quicksum(self.isClientVisited(c, p)*z[i] for i, p in enumerate(self.patterns)) == 1,
-                "Consumer_%d" % c,
-                separate=False, modifiable=True)
-
-            clientCons[i] = cons
+        master.setMinimize()
 
         if not integer:
             pricer = VRPpricer(z, clientCons, self.data, self.patterns,
                                self.data.costs, self.isClientVisited,
-                               self.patCost, self.maxPatterns)
+                               self.patCost, self.maxPatterns, self.pricing,
+                               self.maxColumnsPerRound, self.heuristicPricing,
+                               self.stabilization, self.gapTolerance, self.pool,
+                               self.branchAndPrice, self.neighbours)
 
             master.includePricer(pricer, "VRP pricer", "Identifying new routes")
 
+            if self.branchAndPrice:
+                master.includeBranchrule(EdgeBranching(pricer), "edge branching",
+                                         "Branching on the flow of an edge",
+                                         priority=1000000, maxdepth=-1, maxbounddist=1.0)
+
+            pricer.monitor = self.monitor
+            if self.startRoutes:
+                pricer.upperBound = min(pricer.upperBound,
+                                        sum(route.cost for route in self.startRoutes))
+
             self.pricer = pricer
 
         if integer:
@@ -338,10 +1147,31 @@ class VRPsolver:
             for p in self.patterns:
                 print(p)
 
+        if integer or self.branchAndPrice:
+            self.setStartSolution(master, z)
+
+        if self.scipParams:
+            master.setParams(self.scipParams)
+        if self.beforeOptimize is not None:
+            self.beforeOptimize(master)
+
         self.master = master  # Save master model.
         
         master.optimize()
 
+    def setStartSolution(self, master, z):
+        columns = {p.rows: i for i, p in enumerate(self.patterns)}
+        if not self.startRoutes or any(route.rows not in columns for route in self.startRoutes):
+            return
+
+        sol = master.createSol()
+        for var in z.values():
+            master.setSolVal(sol, var, 0.0)
+        for route in self.startRoutes:
+            master.setSolVal(sol, z[columns[route.rows]], 1.0)
+
+        master.addSol(sol)
+
     def printSolution(self):
 
         if self.integer:
@@ -357,25 +1187,28 @@ class VRPsolver:
 
         return usedPatterns
 
-    def drawSolution(self):
+    def drawSolution(self, filename=None):
+        '''
+        Shows the routes of the solution, or saves the drawing to filename
+        (see vrp_draw.drawEdges).
+        '''
         patterns = self.printSolution()
-        graph = nx.DiGraph()
-
-        for pat in patterns:
-            graph.add_edges_from(pat)
-
-        nx.draw_networkx_nodes(graph, self.data.nodes)
-        nx.draw_networkx_edges(graph, self.data.nodes)
-        nx.draw_networkx_labels(graph, self.data.nodes)
-        plt.show()
+        drawEdges([edge for pat in patterns for edge in pat], self.data.nodes, filename)
         
 
 if __name__ == "__main__":
     data = DataVRP("./data/A-VRP/A-n32-k5.vrp")
     #    data = DataVRP("toy15.vrp")
 
+    # Columns of previous runs on the same instance:
+    poolFile = "%s.pool.json" % data.name
+
     solver = VRPsolver(data, 180)
+    if os.path.exists(poolFile):
+        solver.loadPool(poolFile)
     solver.solve()
+    solver.savePool(poolFile)
+    solver.pricer.printPricingStats()
 
     usedPatterns = solver.printSolution()
     solver.drawSolution()
@@ -384,5 +1217,6 @@ if __name__ == "__main__":
 #    solver.addPatterns(solver.patterns)
 
     solver.solve(integer=True)
+#    solver.solve(branchAndPrice=True)  # Optimal, but takes much longer
 
     solver.drawSolution()
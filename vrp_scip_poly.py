@@ -1,79 +1,137 @@
-from pyscipopt import Model, quicksum, Pricer, SCIP_RESULT, SCIP_PARAMSETTING
-
-# Using networkx for drawing the solution:
-import networkx as nx
-import matplotlib.pyplot as plt
+from pyscipopt import Model, quicksum, Pricer, Sepa, SCIP_RESULT, SCIP_PARAMSETTING
 
 import numpy as np
 
-
-class DataVRP:
-    cap = None  # Capacity of the truck
-    nodes = {}  # Position of the nodes
-    depots = None  # We are assuming one depot
-    demands = {}  # Demand for each node. Demand of the depot is zero
-    costs = {}  # Costs from going from i to j
-    
-    def __init__(self, filename):
-        
-        with open(filename) as fd:
-            lines = fd.readlines()
-
-        i = 0
-        size = None  # Number of nodes
-        while i < len(lines):
-            line = lines[i]
-
-            if line.find("DIMENSION") > -1:
-                size = self.sepIntValue(line)
-            elif line.find("CAPACITY") > -1:
-                self.cap = self.sepIntValue(line)            
-            elif line.find("NODE_COORD_SECTION") > -1:
-                i += 1
-                line = lines[i]
-                for _ in range(size):
-                    n, x, y = [int(val.strip()) for val in line.split()]
-                    i += 1  # Last step starts the DEMAND_SECTION
-                    self.nodes[n] = (x, y)
-                    line = lines[i]
-
-            # Not elif because of NODE_COORD_SECTION process.
-            if line.find("DEMAND_SECTION") > -1:
-                i += 1
-                line = lines[i]
-                for _ in range(size):
-                    n, dem = [int(val.strip()) for val in line.split()]
-                    i += 1
-                    self.demands[n] = dem
-                    line = lines[i]
-
-            if line.find("DEPOT_SECTION") > -1:
-                i += 1
-                depots = []
-                
-                depot = int(lines[i].strip())
-                while depot >= 0:
-                    depots.append(depot)
-                    i += 1
-                    depot = int(lines[i].strip())
-                
-                assert(len(depots) == 1)
-
-                self.depot = depots[0]
-            
-            i += 1
-
-        self.computeCostMatrix()
-
-
-    def sepIntValue(self, line):
-        value = line.split(":")[-1].strip()
-        return int(value)
-
-    def computeCostMatrix(self):
-        for (p1, (x1, y1)) in self.nodes.items():
-            for (p2, (x2, y2)) in self.nodes.items():
-                self.costs[p1, p2] = ((x1 - x2)**2 + (y1 - y2)**2)**0.5
+from vrp_data import DataVRP
+from vrp_draw import drawEdges
+from vrp_heuristics import routeLength, savingsSolution
+
+
+def componentSets(flow, clients, eps=1e-6):
+    '''
+    Connected components of the support graph of the LP solution
+    restricted to the clients.
+    @param flow - (n, n) LP values of the arcs, indexed by rows.
+    @param clients - rows of the clients.
+    @return - a list of boolean masks over rows.
+    '''
+    support = (flow + flow.T) > eps
+    unseen = set(clients)
+    sets = []
+    while unseen:
+        stack = [unseen.pop()]
+        component = np.zeros(len(flow), dtype=bool)
+        component[stack[0]] = True
+        while stack:
+            i = stack.pop()
+            for j in np.nonzero(support[i] & ~component)[0].tolist():
+                if j in unseen:
+                    unseen.discard(j)
+                    component[j] = True
+                    stack.append(j)
+        sets.append(component)
+
+    return sets
+
+
+def greedyShrinkingSets(flow, clients, demand, cap, eps=1e-6):
+    '''
+    Greedy shrinking: starting from each client, S grows by the client
+    most connected to it (the largest x(S:j) + x(j:S)), which is the same
+    as contracting that client into S. Every S met along the way that
+    violates its rounded capacity inequality is returned.
+    @return - a list of boolean masks over rows.
+    '''
+    n = len(flow)
+    weight = flow + flow.T
+    isClient = np.zeros(n, dtype=bool)
+    isClient[clients] = True
+
+    sets = {}
+    for seed in clients:
+        inS = np.zeros(n, dtype=bool)
+        inS[seed] = True
+        load = demand[seed]
+        inflow = flow[:, seed].sum()
+        connection = weight[seed].copy()  # x(S:j) + x(j:S) of each j
+
+        for _ in range(len(clients) - 1):
+            candidates = np.where(isClient & ~inS, connection, -1.0)
+            j = int(np.argmax(candidates))
+            if candidates[j] < 0:
+                break
+
+            # Arcs (j, S) become internal, arcs (i, j) from outside enter S:
+            inflow -= flow[j, inS].sum()
+            inS[j] = True
+            inflow += flow[~inS, j].sum()
+            load += demand[j]
+            connection += weight[j]
+
+            if inflow < np.ceil(load/cap) - eps:
+                sets.setdefault(inS.tobytes(), inS.copy())
+
+    return list(sets.values())
+
+
+class CapacityCutSeparator(Sepa):
+    '''
+    Separates rounded capacity inequalities x(delta-(S)) >= ceil(d(S)/Q)
+    (at least ceil(d(S)/Q) vehicles enter the set of clients S) for the
+    MTZ model. The sets come from the connected components of the LP
+    support graph and from greedy shrinking.
+    '''
+
+    # Maximum number of cuts added per round:
+    maxCuts = 50
+
+    # Minimum violation of a cut:
+    eps = 1e-4
+
+    def __init__(self, data, x):
+        '''
+        @param data - DataVRP object.
+        @param x - arc variables x[i, j] keyed by node ids.
+        '''
+        self.data = data
+        self.x = x
+        self.arcs = [(var, data.index[i], data.index[j]) for (i, j), var in x.items()]
+        self.clients = [r for r in range(len(data.ids)) if r != data.depotIndex]
+        self.nCuts = 0
+
+    def sepaexeclp(self):
+        n = len(self.data.ids)
+        flow = np.zeros((n, n))
+        for var, i, j in self.arcs:
+            flow[i, j] = self.model.getSolVal(None, var)
+
+        demand, cap = self.data.demand, self.data.cap
+        candidates = componentSets(flow, self.clients) + \
+            greedyShrinkingSets(flow, self.clients, demand, cap)
+
+        cuts = {}
+        for inS in candidates:
+            rhs = np.ceil(demand[inS].sum()/cap)
+            violation = rhs - flow[~inS][:, inS].sum()
+            if violation > self.eps:
+                cuts[inS.tobytes()] = (violation, rhs, inS)
+
+        cuts = sorted(cuts.values(), key=lambda cut: -cut[0])[:self.maxCuts]
+        for _, rhs, inS in cuts:
+            row = self.model.createEmptyRowSepa(self, "capacity_%d" % self.nCuts, lhs=rhs,
+                                                rhs=None, local=False)
+            self.model.cacheRowExtensions(row)
+            for var, i, j in self.arcs:
+                if inS[j] and not inS[i]:
+                    self.model.addVarToRow(row, var, 1.0)
+            self.model.flushRowExtensions(row)
+            self.model.addCut(row)
+            self.model.releaseRow(row)
+            self.nCuts += 1
+
+        if cuts:
+            return {"result": SCIP_RESULT.SEPARATED}
+        return {"result": SCIP_RESULT.DIDNOTFIND}
 
 
 class VRPSolver(Pricer):
@@ -86,26 +144,64 @@ class VRPSolver(Pricer):
     # Model that holds the VRP problem (MTZ):
     model = None
 
+    # Separator of rounded capacity cuts (see CapacityCutSeparator):
+    separator = None
+
+    # Routes (as node ids) of the starting solution, see setStartSolution:
+    startRoutes = None
+
+    # Extra SCIP parameters of the model (e.g. {"lp/threads": 1}):
+    scipParams = None
+
+    # Called with the SCIP model just before it is optimized, e.g. to
+    # include event handlers (see vrp_benchmark.py):
+    beforeOptimize = None
+
     def __init__(self, vrpData):
         self.data = vrpData
         self.clientNodes = [n for n in self.data.nodes.keys() if n != self.data.depot]
         
-    def solve(self, timeLimit):
+    def getArcs(self, neighbours=None):
+        '''
+        Arcs (i, j) of the model as node ids: every ordered pair, or the
+        sparse set of DataVRP.nearestNeighbourArcs when neighbours is given.
+        '''
+        if neighbours is None:
+            return [(i, j) for i in self.data.nodes for j in self.data.nodes if i != j]
+
+        ids = self.data.ids
+        return [(int(ids[i]), int(ids[j])) for i, j in self.data.nearestNeighbourArcs(neighbours)]
+
+    def solve(self, timeLimit, capacityCuts=True, neighbours=None, warmStart=True):
+        '''
+        @param neighbours - if given, only the arcs between each node and its
+        neighbours nearest nodes (and the depot arcs) are in the model. The
+        model has O(n*neighbours) variables instead of O(n^2), but the
+        solution is only optimal over that arc set.
+        @param warmStart - whether SCIP starts from the Clarke-Wright
+        solution (see setStartSolution).
+        '''
 
         # Model for the vrp:
         subMIP = Model("VRP-MTZ")
 
-        subMIP.setMinimize
+        subMIP.setMinimize()
 
         subMIP.setRealParam("limits/time", timeLimit)
+        if self.scipParams:
+            subMIP.setParams(self.scipParams)
+
+        arcs = self.getArcs(neighbours)
+        inArcs = {i: [] for i in self.data.nodes}
+        outArcs = {i: [] for i in self.data.nodes}
         
         # Binary variables x_ij indicating whether the vehicle
         # traverses edge (i, j)
         x = {}
-        for i in self.data.nodes:
-            for j in self.data.nodes:
-                if i != j:
-                    x[i, j] = subMIP.addVar(vtype="B", obj=self.data.costs[i, j], name="x_%d_%d" % (i, j))
+        for i, j in arcs:
+            x[i, j] = subMIP.addVar(vtype="B", obj=self.data.costs[i, j], name="x_%d_%d" % (i, j))
+            outArcs[i].append(x[i, j])
+            inArcs[j].append(x[i, j])
 
         # Non negative variables u_i indicating the demand served up to node i:
         u = {}
@@ -113,21 +209,59 @@ class VRPSolver(Pricer):
             u[i] = subMIP.addVar(vtype="C", lb=0, ub=self.data.cap, obj=0.0, name="u_%d" % i)
 
         for j in self.clientNodes:
-            subMIP.addCons(quicksum(x[i, j] for i in self.data.nodes if i != j) == 1)
+            subMIP.addCons(quicksum(inArcs[j]) == 1)
 
         for h in self.clientNodes:
-            subMIP.addCons(quicksum(x[i, h] for i in self.data.nodes if i != h) ==
-                           quicksum(x[h, i] for i in self.data.nodes if i != h))
+            subMIP.addCons(quicksum(inArcs[h]) == quicksum(outArcs[h]))
 
-        for i in self.data.nodes:
-            for j in self.clientNodes:
-                if i != j:
-                    subMIP.addCons(u[j] >= u[i] + self.data.demands[j]*x[i, j] - self.data.cap*(1 - x[i, j]))
+        for i, j in arcs:
+            if j != self.data.depot:
+                subMIP.addCons(u[j] >= u[i] + self.data.demands[j]*x[i, j] - self.data.cap*(1 - x[i, j]))
+
+        # The MTZ constraints give a weak bound, capacity cuts strengthen it:
+        if capacityCuts:
+            self.separator = CapacityCutSeparator(self.data, x)
+            subMIP.includeSepa(self.separator, "capacity", "Rounded capacity cuts",
+                               priority=1000, freq=1)
+
+        if warmStart:
+            self.setStartSolution(subMIP, x, u)
+
+        if self.beforeOptimize is not None:
+            self.beforeOptimize(subMIP)
 
         subMIP.optimize()
 
         self.model = subMIP
 
+    def setStartSolution(self, subMIP, x, u):
+        '''
+        Gives SCIP the Clarke-Wright savings solution improved by local
+        search (see vrp_heuristics.savingsSolution) as the first incumbent.
+        '''
+        data = self.data
+        routes = savingsSolution(data.dist, data.demand, data.cap, data.depotIndex)
+        self.startRoutes = [[int(data.ids[r]) for r in route] for route in routes]
+
+        sol = subMIP.createSol()
+        for var in x.values():
+            subMIP.setSolVal(sol, var, 0.0)
+
+        for route in self.startRoutes:
+            load = 0
+            for i, j in zip(route, route[1:]):
+                if (i, j) not in x:
+                    return  # Arc left out of a sparse model
+                subMIP.setSolVal(sol, x[i, j], 1.0)
+                if j != data.depot:
+                    load += data.demands[j]
+                    subMIP.setSolVal(sol, u[j], load)
+
+        subMIP.setSolVal(sol, u[data.depot], 0.0)
+        print("Starting solution of cost %.2f" %
+              sum(routeLength(route, data.dist) for route in routes))
+        subMIP.addSol(sol)
+
     def printSolution(self):
         edges = []
         print("Used edges:")
@@ -141,16 +275,12 @@ class VRPSolver(Pricer):
 
         return edges
 
-    def drawSolution(self):
-        edges = self.printSolution()
-        graph = nx.DiGraph()
-
-        graph.add_edges_from(edges)
-
-        nx.draw_networkx_nodes(graph, self.data.nodes)
-        nx.draw_networkx_edges(graph, self.data.nodes)
-        nx.draw_networkx_labels(graph, self.data.nodes)
-        plt.show()
+    def drawSolution(self, filename=None):
+        '''
+        Shows the used edges, or saves the drawing to filename (see
+        vrp_draw.drawEdges).
+        '''
+        drawEdges(self.printSolution(), self.data.nodes, filename)
 
 
 if __name__ == "__main__":